@@ -3,6 +3,7 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from jinja2 import FileSystemBytecodeCache
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -23,6 +24,12 @@ def create_app(config_name=None):
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Share compiled templates between workers and across restarts
+    if app.config.get('JINJA_BYTECODE_CACHE_DIR'):
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+            str(app.config['JINJA_BYTECODE_CACHE_DIR']))
+    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
@@ -52,12 +59,35 @@ def create_app(config_name=None):
     from app.admin import bp as admin_bp
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+    # API clients get a 401 instead of a redirect to the login page
+    login_manager.blueprint_login_views['api'] = None
+    
+    # Live feed fan-out (one poller per worker process)
+    from app.community.live import FeedBroker
+    FeedBroker(app)
+    
+    # Coalesced reaction counter updates (one flusher per worker process)
+    from app.community.reactions import ReactionCounter
+    ReactionCounter(app)
+    
+    # Fingerprinted static assets and compression
+    from app import assets
+    assets.init_app(app)
+    
     # Register main routes
     from app import routes
     routes.init_app(app)
     
-    # Create tables in development
+    # Register CLI commands
+    from app import cli
+    cli.init_app(app)
+    
+    # Create tables in development (community feeds on every bind)
     with app.app_context():
-        db.create_all()
+        from app.community.feeds import feed_tables
+        feed_tables()
+        db.create_all(bind_key=[None, *app.config.get('SQLALCHEMY_BINDS', {})])
     
     return app
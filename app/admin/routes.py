@@ -1,11 +1,15 @@
 """Admin routes."""
 from functools import wraps
-from flask import render_template, redirect, url_for, flash, request, abort
+from flask import render_template, redirect, url_for, flash, request, abort, current_app
 from flask_login import login_required, current_user
-
 from app import db
 from app.admin import bp
-from app.models import User, Sunflower, JournalEntry
+from app.models import User, JournalEntry, ArchivedEntry
+from app.journal.phash import ban_near_matches, similar_entries
+from app.read_models import entry_card_query, to_cards
+
+# Columns shown in user listings
+USER_LIST_COLUMNS = (User.id, User.display_name, User.email, User.created_at, User.is_admin)
 
 
 def admin_required(f):
@@ -26,10 +30,12 @@ def dashboard():
     # Get counts
     user_count = User.query.count()
     entry_count = JournalEntry.query.count()
-    recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
-    recent_entries = JournalEntry.query \
-        .order_by(JournalEntry.created_at.desc()) \
+    recent_users = db.session.query(*USER_LIST_COLUMNS) \
+        .order_by(User.created_at.desc()) \
         .limit(10).all()
+    recent_entries = to_cards(entry_card_query()
+                              .order_by(JournalEntry.created_at.desc())
+                              .limit(10))
     
     return render_template('admin/dashboard.html',
                          user_count=user_count,
@@ -46,7 +52,7 @@ def users():
     page = request.args.get('page', 1, type=int)
     per_page = 50
     
-    pagination = User.query \
+    pagination = db.session.query(*USER_LIST_COLUMNS) \
         .order_by(User.created_at.desc()) \
         .paginate(page=page, per_page=per_page, error_out=False)
     
@@ -59,17 +65,22 @@ def users():
 @login_required
 @admin_required
 def entries():
-    """List all journal entries for moderation."""
+    """List all journal entries (or only flagged duplicate photos) for moderation."""
     page = request.args.get('page', 1, type=int)
+    duplicates = request.args.get('duplicates', 0, type=int)
     per_page = 50
     
-    pagination = JournalEntry.query \
+    query = entry_card_query()
+    if duplicates:
+        query = query.filter(JournalEntry.photo_duplicate_of.is_not(None))
+    pagination = query \
         .order_by(JournalEntry.created_at.desc()) \
         .paginate(page=page, per_page=per_page, error_out=False)
     
     return render_template('admin/entries.html',
-                         entries=pagination.items,
-                         pagination=pagination)
+                         entries=to_cards(pagination.items),
+                         pagination=pagination,
+                         duplicates=duplicates)
 
 
 @bp.route('/entry/<int:entry_id>/delete', methods=['POST'])
@@ -79,18 +90,82 @@ def delete_entry(entry_id):
     """Delete entry (moderation)."""
     entry = JournalEntry.query.get_or_404(entry_id)
     
-    # Delete photo if exists
-    from app.journal.utils import delete_photo
-    if entry.photo_path:
-        delete_photo(entry.photo_path)
-    
+    photo_path = entry.photo_path
     db.session.delete(entry)
     db.session.commit()
     
+    # Delete photo once the row is gone
+    from app.journal.utils import delete_photo
+    if photo_path:
+        delete_photo(photo_path)
+    
     flash('Entry deleted.', 'info')
     return redirect(url_for('admin.entries'))
 
 
+def _entry_photo_hash(entry):
+    """The entry's photo hash, computed from the file for photos stored before hashing."""
+    if entry.photo_hash is None and entry.photo_path:
+        from app.journal.utils import photo_info
+        try:
+            return photo_info(current_app.config['UPLOAD_FOLDER'] / entry.photo_path).phash
+        except OSError:
+            return None
+    return entry.photo_hash
+
+
+@bp.route('/entry/<int:entry_id>/similar')
+@login_required
+@admin_required
+def similar(entry_id):
+    """Entries whose photo is a near duplicate of this entry's."""
+    entry = JournalEntry.query.get_or_404(entry_id)
+    value = _entry_photo_hash(entry)
+    if value is None:
+        flash('This entry has no readable photo.', 'error')
+        return redirect(url_for('admin.entries'))
+    
+    live, archived = similar_entries(value)
+    live_ids = [match.id for match in live if match.id != entry.id]
+    archived_ids = [match.id for match in archived]
+    # Compact rows for display, kept in closest-first order
+    cards = {card.id: card for card in to_cards(
+        entry_card_query().filter(JournalEntry.id.in_([entry.id, *live_ids])))}
+    archived_cards = {card.id: card for card in to_cards(
+        entry_card_query(ArchivedEntry).filter(ArchivedEntry.id.in_(archived_ids)))}
+    
+    return render_template('admin/similar.html',
+                         entry=cards[entry.id],
+                         matches=[cards[i] for i in live_ids],
+                         archived=[archived_cards[i] for i in archived_ids])
+
+
+@bp.route('/entry/<int:entry_id>/ban-photo', methods=['POST'])
+@login_required
+@admin_required
+def ban_photo(entry_id):
+    """Ban an entry's photo and remove it and all its near duplicates."""
+    entry = JournalEntry.query.get_or_404(entry_id)
+    value = _entry_photo_hash(entry)
+    if value is None:
+        flash('This entry has no readable photo.', 'error')
+        return redirect(url_for('admin.entries'))
+    
+    removed = ban_near_matches(value, banned_by=current_user)
+    # Not-yet-hashed photos are missed by the lookup; always take down this one
+    if entry.photo_path:
+        removed.append(entry.photo_path)
+        entry.set_photo(None)
+    db.session.commit()
+    
+    from app.journal.utils import delete_photo
+    for photo_path in removed:
+        delete_photo(photo_path)
+    
+    flash(f'Image banned; {len(removed)} matching photo(s) removed.', 'info')
+    return redirect(url_for('admin.entries'))
+
+
 @bp.route('/user/<int:user_id>/toggle-admin', methods=['POST'])
 @login_required
 @admin_required
@@ -124,15 +199,22 @@ def delete_user(user_id):
         flash('Cannot delete your own account from admin panel.', 'error')
         return redirect(url_for('admin.users'))
     
-    # Delete all photos for user's entries
-    from app.journal.utils import delete_photo
+    # Collect photos first; files are removed once the rows are gone
+    photo_paths = []
     if user.sunflower:
-        for entry in user.sunflower.entries:
-            if entry.photo_path:
-                delete_photo(entry.photo_path)
+        photo_paths = [path for path, in user.sunflower.entries
+                       .filter(JournalEntry.photo_path.is_not(None))
+                       .with_entities(JournalEntry.photo_path)]
+        photo_paths += [path for path, in user.sunflower.archived_entries
+                        .filter(ArchivedEntry.photo_path.is_not(None))
+                        .with_entities(ArchivedEntry.photo_path)]
     
     db.session.delete(user)
     db.session.commit()
     
+    from app.journal.utils import delete_photo
+    for photo_path in photo_paths:
+        delete_photo(photo_path)
+    
     flash(f'User {user.display_name} and all associated data deleted.', 'info')
     return redirect(url_for('admin.users'))
@@ -0,0 +1,6 @@
+"""JSON API blueprint (versioned by URL prefix)."""
+from flask import Blueprint
+
+bp = Blueprint('api', __name__)
+
+from app.api import routes
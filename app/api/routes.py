@@ -0,0 +1,171 @@
+"""Delta sync API for mobile and offline clients."""
+import base64
+import binascii
+import io
+
+from flask import current_app, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.exceptions import HTTPException
+
+from app import db
+from app.api import bp
+from app.journal.forms import JournalEntryForm
+from app.journal.utils import delete_photo, save_photo
+from app.models import JournalEntry
+from app.sync import changes
+
+
+def _entry_json(entry):
+    """Everything a client stores about an entry; the photo is its upload key."""
+    return {
+        'id': entry.id,
+        'rev': entry.rev,
+        'key': entry.client_key,
+        'date': entry.date.isoformat(),
+        'note': entry.note,
+        'height_cm': entry.height_cm,
+        'photo': entry.photo_path,
+        'photo_width': entry.photo_width,
+        'photo_height': entry.photo_height,
+        'photo_placeholder': entry.photo_placeholder,
+        'is_public': entry.is_public,
+        'created_at': entry.created_at.isoformat(),
+        'updated_at': entry.updated_at.isoformat() if entry.updated_at else None,
+    }
+
+
+def _sunflower_json(sunflower):
+    """A sunflower's synced settings."""
+    return {
+        'id': sunflower.id,
+        'rev': sunflower.rev,
+        'name': sunflower.name,
+        'planted_date': sunflower.planted_date.isoformat(),
+        'theme': sunflower.theme,
+    }
+
+
+@bp.errorhandler(HTTPException)
+def json_error(error):
+    """Errors as JSON rather than HTML pages."""
+    return jsonify(error=error.name, message=error.description), error.code
+
+
+@bp.route('/sync')
+@login_required
+def sync():
+    """Changes to the user's sunflower and entries after revision `since`."""
+    since = request.args.get('since', 0, type=int)
+    result = changes(current_user, max(since, 0), current_app.config['SYNC_PAGE_SIZE'])
+    
+    sunflower = result['sunflower']
+    return jsonify(
+        rev=result['rev'],
+        reset=result['reset'],
+        more=result['more'],
+        sunflower=_sunflower_json(sunflower) if sunflower else None,
+        entries=[_entry_json(entry) for entry in result['entries']],
+        deleted=result['deleted'],
+    )
+
+
+def _entry_form(item):
+    """Validate one uploaded entry with the same rules as the web form."""
+    data = MultiDict({name: str(item[name]) for name in ('date', 'note', 'height_cm')
+                      if item.get(name) is not None})
+    photo = item.get('photo')
+    if photo:
+        try:
+            content = base64.b64decode(photo.get('data', ''), validate=True)
+        except (AttributeError, binascii.Error):
+            content = b''
+        data['photo'] = FileStorage(io.BytesIO(content), filename=str(photo.get('filename', '')))
+    return JournalEntryForm(formdata=data, meta={'csrf': False})
+
+
+def _create_entries(sunflower, items):
+    """
+    Create the entries in `items` whose keys are new; one commit for the batch.
+    
+    Returns:
+        list: Per-item result dicts, in upload order
+    """
+    keys = [item['key'] for item in items]
+    existing = {entry.client_key: entry for entry in JournalEntry.query
+                .filter(JournalEntry.sunflower_id == sunflower.id, JournalEntry.client_key.in_(keys))}
+    
+    results, saved = [], []
+    for item in items:
+        key = item['key']
+        if key in existing:
+            results.append({'key': key, 'status': 'exists', 'id': existing[key].id})
+            continue
+        
+        form = _entry_form(item)
+        if not form.validate():
+            results.append({'key': key, 'status': 'invalid', 'errors': form.errors})
+            continue
+        is_public = item.get('is_public', True)
+        if not isinstance(is_public, bool):
+            results.append({'key': key, 'status': 'invalid', 'errors': {'is_public': ['Must be true or false.']}})
+            continue
+        photo = save_photo(form.photo.data) if form.photo.data else None
+        if form.photo.data and not photo:
+            results.append({'key': key, 'status': 'invalid', 'errors': {'photo': ['Could not save photo.']}})
+            continue
+        
+        entry = JournalEntry(sunflower_id=sunflower.id, client_key=key, date=form.date.data,
+                             note=form.note.data, height_cm=form.height_cm.data,
+                             is_public=is_public)
+        entry.set_photo(photo)
+        db.session.add(entry)
+        existing[key] = entry
+        saved.append(entry.photo_path)
+        results.append({'key': key, 'status': 'created', 'entry': entry})
+    
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for photo_path in saved:
+            delete_photo(photo_path)
+        raise
+    
+    return [{'key': result['key'], 'status': 'created', 'id': result['entry'].id,
+             'rev': result['entry'].rev} if 'entry' in result else result
+            for result in results]
+
+
+@bp.route('/entries', methods=['POST'])
+@login_required
+def upload_entries():
+    """
+    Create a batch of entries recorded offline.
+    
+    Each entry carries a client-chosen `key`; uploading a key again (a
+    retry after a lost response) returns the entry already created.
+    """
+    sunflower = current_user.sunflower
+    payload = request.get_json(silent=True)
+    items = payload.get('entries') if isinstance(payload, dict) else None
+    if sunflower is None:
+        return jsonify(error='Not Found', message='No sunflower to add entries to.'), 404
+    if not isinstance(items, list) or not items:
+        return jsonify(error='Bad Request', message='Send {"entries": [...]} as JSON.'), 400
+    if len(items) > current_app.config['SYNC_UPLOAD_LIMIT']:
+        return jsonify(error='Bad Request', message='Too many entries in one batch.'), 400
+    
+    keys = [item.get('key') if isinstance(item, dict) else None for item in items]
+    if any(not isinstance(key, str) or not 0 < len(key) <= 64 for key in keys) \
+            or len(set(keys)) != len(keys):
+        return jsonify(error='Bad Request', message='Every entry needs a unique key of 1-64 characters.'), 400
+    
+    try:
+        results = _create_entries(sunflower, items)
+    except IntegrityError:
+        # A concurrent retry created some of these keys first; they now exist
+        results = _create_entries(sunflower, items)
+    
+    return jsonify(entries=results)
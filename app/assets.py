@@ -0,0 +1,151 @@
+"""Static asset fingerprinting and response compression."""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Built, content-hashed copies of static assets live here
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Static subfolders whose files never change once written (unique names)
+IMMUTABLE_PREFIXES = (f'{DIST_DIR}/', 'uploads/', 'timelapses/')
+
+# Folders holding user content rather than assets
+SKIP_DIRS = {DIST_DIR, 'uploads', 'timelapses'}
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/xml',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+
+def _compress(data, encoding, level):
+    """Compress a body with gzip or Brotli."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def _preferred_encoding():
+    """Best encoding the client accepts, or None."""
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def build_assets(static_folder, min_size):
+    """
+    Write content-hashed, precompressed copies of every static asset.
+    
+    Args:
+        static_folder: The app's static folder
+        min_size: Smallest file (in bytes) worth precompressing
+    
+    Returns:
+        dict: Manifest mapping original paths to fingerprinted paths
+    """
+    static_folder = Path(static_folder)
+    dist = static_folder / DIST_DIR
+    shutil.rmtree(dist, ignore_errors=True)
+    
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if Path(root) == static_folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            if name.startswith('.'):
+                continue
+            source = Path(root) / name
+            relative = source.relative_to(static_folder).as_posix()
+            data = source.read_bytes()
+            
+            stem, dot, ext = name.rpartition('.')
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed_name = f'{stem}.{digest}.{ext}' if dot else f'{name}.{digest}'
+            target = dist / Path(relative).parent / hashed_name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+            
+            if mimetypes.guess_type(name)[0] in COMPRESSIBLE_TYPES and len(data) >= min_size:
+                target.with_name(hashed_name + '.gz').write_bytes(_compress(data, 'gzip', 9))
+                if brotli is not None:
+                    target.with_name(hashed_name + '.br').write_bytes(_compress(data, 'br', 11))
+            
+            manifest[relative] = target.relative_to(static_folder).as_posix()
+    
+    (dist / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def load_manifest(static_folder):
+    """Read the manifest written by build_assets, if there is one."""
+    try:
+        return json.loads((Path(static_folder) / DIST_DIR / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app):
+    """Serve fingerprinted assets and compress responses."""
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        """Point url_for('static', ...) at the fingerprinted copy when one exists."""
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = app.extensions['asset_manifest'].get(
+                values['filename'], values['filename'])
+    
+    def static(filename):
+        """Static files, preferring precompressed variants; immutable where names are unique."""
+        immutable = filename.startswith(IMMUTABLE_PREFIXES)
+        max_age = app.config['STATIC_IMMUTABLE_MAX_AGE'] if immutable else None
+        encoding = _preferred_encoding()
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding)
+        
+        if suffix and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, max_age=max_age,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(app.static_folder, filename, max_age=max_age)
+        
+        response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+    
+    app.view_functions['static'] = static
+    
+    @app.after_request
+    def compress_response(response):
+        """Compress dynamic text responses above COMPRESS_MIN_SIZE."""
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code == 204
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        
+        response.vary.add('Accept-Encoding')
+        encoding = _preferred_encoding()
+        data = response.get_data()
+        if encoding is None or len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        
+        response.set_data(_compress(data, encoding, app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = encoding
+        return response
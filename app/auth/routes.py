@@ -1,5 +1,5 @@
 """Authentication routes."""
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, current_user
 from urllib.parse import urlparse
 from datetime import datetime
@@ -7,6 +7,7 @@ from datetime import datetime
 from app import db
 from app.auth import bp
 from app.auth.forms import LoginForm, RegistrationForm, RequestPasswordResetForm, ResetPasswordForm
+from app.mail import enqueue_email
 from app.models import User, Sunflower
 
 
@@ -91,12 +92,22 @@ def reset_password_request():
         user = User.query.filter_by(email=form.email.data.lower()).first()
         
         if user:
-            # TODO: Send password reset email
-            # For now, just show a message
-            flash('Password reset instructions have been sent to your email.', 'info')
-        else:
-            # Don't reveal that email doesn't exist (security)
-            flash('Password reset instructions have been sent to your email.', 'info')
+            # Queued for `flask send-mail`; the request never waits on SMTP
+            enqueue_email(
+                user.email,
+                'Reset your Sunflower Journal password',
+                render_template(
+                    'email/reset_password.txt',
+                    user=user,
+                    reset_url=url_for('auth.reset_password',
+                                      token=user.get_reset_password_token(), _external=True),
+                    expires_minutes=current_app.config['PASSWORD_RESET_TOKEN_MAX_AGE'] // 60
+                )
+            )
+            db.session.commit()
+        
+        # Same message either way: don't reveal whether the email exists (security)
+        flash('Password reset instructions have been sent to your email.', 'info')
         
         return redirect(url_for('auth.login'))
     
@@ -109,13 +120,17 @@ def reset_password(token):
     if current_user.is_authenticated:
         return redirect(url_for('journal.my_journal'))
     
-    # TODO: Verify token and get user
-    # For MVP, this is a placeholder
+    user = User.verify_reset_password_token(token)
+    if not user:
+        flash('That reset link is invalid or has expired. Please request a new one.', 'error')
+        return redirect(url_for('auth.reset_password_request'))
     
     form = ResetPasswordForm()
     
     if form.validate_on_submit():
-        # TODO: Update user password
+        user.set_password(form.password.data)
+        db.session.commit()
+        
         flash('Your password has been reset.', 'success')
         return redirect(url_for('auth.login'))
     
@@ -0,0 +1,252 @@
+"""Flask CLI commands."""
+import sys
+import time
+
+import click
+from jinja2 import TemplateSyntaxError
+from sqlalchemy import delete, func, select
+
+from app import db
+
+
+def init_app(app):
+    """Register CLI commands with app."""
+    
+    @app.cli.command('precompile-templates')
+    def precompile_templates():
+        """Compile every template into the bytecode cache (run at build time)."""
+        env = app.jinja_env
+        if env.bytecode_cache is None:
+            click.echo('JINJA_BYTECODE_CACHE_DIR is not set; nothing to precompile.', err=True)
+            sys.exit(1)
+        
+        started = time.perf_counter()
+        failed = 0
+        names = env.list_templates()
+        for name in names:
+            try:
+                env.get_template(name)
+            except TemplateSyntaxError as e:
+                failed += 1
+                click.echo(f'{name}:{e.lineno}: {e.message}', err=True)
+        
+        elapsed = time.perf_counter() - started
+        click.echo(f'Compiled {len(names) - failed} templates in {elapsed:.2f}s.')
+        if failed:
+            sys.exit(1)
+    
+    @app.cli.command('build-assets')
+    def build_assets():
+        """Fingerprint and precompress static assets into static/dist."""
+        from app.assets import build_assets
+        
+        manifest = build_assets(app.static_folder, app.config['COMPRESS_MIN_SIZE'])
+        click.echo(f'Built {len(manifest)} assets into {app.static_folder}/dist.')
+    
+    @app.cli.command('rebuild-feed')
+    @click.option('--batch-size', default=5000, show_default=True,
+                  help='Entries re-derived per transaction.')
+    def rebuild_feed(batch_size):
+        """Rebuild the community feed timeline from journal entries."""
+        from app.community import timeline
+        from app.models import FeedItem, JournalEntry
+        
+        max_id = db.session.scalar(select(func.max(JournalEntry.id))) or 0
+        
+        # Walk id ranges so the feed stays readable while it is rebuilt
+        for first_id in range(1, max_id + 1, batch_size):
+            timeline.rebuild_range(db.session.connection(), first_id, first_id + batch_size - 1)
+            db.session.commit()
+        
+        db.session.execute(delete(FeedItem).where(FeedItem.entry_id > max_id))
+        db.session.commit()
+        
+        total = db.session.scalar(select(func.count()).select_from(FeedItem))
+        click.echo(f'Feed timeline rebuilt: {total} public entries.')
+    
+    @app.cli.command('recount-reactions')
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Entries recounted per transaction.')
+    def recount_reactions(batch_size):
+        """Recompute every entry's reaction count from the reactions table."""
+        from app.community import reactions
+        from app.models import JournalEntry
+        
+        entry_ids = db.session.scalars(select(JournalEntry.id).order_by(JournalEntry.id)).all()
+        for start in range(0, len(entry_ids), batch_size):
+            reactions.recount(db.session, entry_ids[start:start + batch_size])
+            db.session.commit()
+        
+        click.echo(f'Reaction counts recomputed for {len(entry_ids)} entries.')
+    
+    @app.cli.command('rebuild-journal-buckets')
+    @click.option('--batch-size', default=500, show_default=True,
+                  help='Sunflowers rebuilt per transaction.')
+    def rebuild_journal_buckets(batch_size):
+        """Recompute the week and month summaries behind My Journal."""
+        from app.journal import buckets
+        from app.models import Sunflower
+        
+        sunflower_ids = db.session.scalars(select(Sunflower.id).order_by(Sunflower.id)).all()
+        for start in range(0, len(sunflower_ids), batch_size):
+            for sunflower_id in sunflower_ids[start:start + batch_size]:
+                buckets.rebuild_sunflower(db.session.connection(), sunflower_id)
+            db.session.commit()
+        
+        click.echo(f'Journal summaries rebuilt for {len(sunflower_ids)} sunflowers.')
+    
+    @app.cli.command('rebuild-leaderboard')
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Sunflowers rebuilt per transaction.')
+    def rebuild_leaderboard(batch_size):
+        """Recompute every sunflower's tallest height per season."""
+        from app.community import leaderboard
+        from app.models import SeasonHeight, Sunflower
+        
+        max_id = db.session.scalar(select(func.max(Sunflower.id))) or 0
+        for first_id in range(1, max_id + 1, batch_size):
+            leaderboard.rebuild_range(db.session.connection(), first_id, first_id + batch_size - 1)
+            db.session.commit()
+        leaderboard._cache.clear()
+        
+        total = db.session.scalar(select(func.count()).select_from(SeasonHeight))
+        click.echo(f'Leaderboard rebuilt: {total} sunflower seasons.')
+    
+    @app.cli.command('prune-sync-tombstones')
+    @click.option('--days', type=int, default=None,
+                  help='Keep tombstones this many days (default: SYNC_TOMBSTONE_DAYS).')
+    def prune_sync_tombstones(days):
+        """Delete old deletion records; clients that synced before them start over."""
+        from datetime import timedelta
+        from app.sync import prune_tombstones
+        
+        days = app.config['SYNC_TOMBSTONE_DAYS'] if days is None else days
+        click.echo(f'Pruned {prune_tombstones(timedelta(days=days))} sync tombstones.')
+    
+    @app.cli.command('archive-entries')
+    @click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Archive entries dated before this day '
+                       '(default: start of the oldest season kept, see ARCHIVE_KEEP_SEASONS).')
+    @click.option('--sunflower', 'sunflower_id', type=int, default=None,
+                  help="Only archive this sunflower's entries.")
+    @click.option('--batch-size', default=500, show_default=True,
+                  help='Entries moved per transaction.')
+    def archive_entries(before, sunflower_id, batch_size):
+        """Move past seasons' journal entries into the archive table."""
+        from datetime import date
+        from app.journal import archive
+        
+        before = before.date() if before else \
+            archive.season_cutoff(date.today(), app.config['ARCHIVE_KEEP_SEASONS'])
+        moved = archive.archive_entries(before, batch_size, sunflower_id)
+        click.echo(f'Archived {moved} entries dated before {before}.')
+    
+    @app.cli.command('restore-entries')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+                  help='Restore archived entries dated on or after this day.')
+    @click.option('--sunflower', 'sunflower_id', type=int, default=None,
+                  help="Only restore this sunflower's entries.")
+    @click.option('--batch-size', default=500, show_default=True,
+                  help='Entries moved per transaction.')
+    def restore_entries(since, sunflower_id, batch_size):
+        """Move archived entries back into the journal, feed and summaries."""
+        from app.journal import archive
+        
+        moved = archive.restore_entries(since.date(), batch_size, sunflower_id)
+        click.echo(f'Restored {moved} entries dated on or after {since.date()}.')
+    
+    @app.cli.command('create-community')
+    @click.argument('slug')
+    @click.argument('name')
+    @click.option('--bind', 'bind_key', default=None,
+                  help='SQLALCHEMY_BINDS key to keep this community\'s feed on.')
+    def create_community(slug, name, bind_key):
+        """Create a community group."""
+        from app.models import Community
+        
+        if bind_key and bind_key not in app.config.get('SQLALCHEMY_BINDS', {}):
+            click.echo(f'Unknown bind {bind_key!r}; add it to SQLALCHEMY_BINDS first.', err=True)
+            sys.exit(1)
+        db.session.add(Community(slug=slug, name=name, bind_key=bind_key))
+        db.session.commit()
+        click.echo(f'Created community {slug}.')
+    
+    @app.cli.command('rebuild-community-feeds')
+    def rebuild_community_feeds():
+        """Rebuild every community feed from its members' entries."""
+        from app.community.feeds import rebuild_community
+        from app.models import Community
+        
+        communities = Community.query.order_by(Community.id).all()
+        for community in communities:
+            rebuild_community(db.session, community)
+            db.session.commit()
+        click.echo(f'Rebuilt {len(communities)} community feeds.')
+    
+    @app.cli.command('send-mail')
+    @click.option('--once', is_flag=True, help='Send one batch and exit instead of running forever.')
+    def send_mail(once):
+        """Deliver queued emails (run as a long-lived background process)."""
+        from app.mail import MailSender
+        
+        sender = MailSender(app.config)
+        if once:
+            try:
+                sent = sender.send_batch()
+            finally:
+                sender.close()
+            click.echo(f'Processed {sent} queued emails.')
+        else:
+            click.echo(f"Sending queued mail via {app.config['MAIL_SERVER']}:{app.config['MAIL_PORT']}...")
+            sender.run()
+    
+    @app.cli.command('reconcile-uploads')
+    @click.option('--limit', default=100000, show_default=True,
+                  help='Files and rows examined per run; later runs continue from a checkpoint.')
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Names checked against the database per query.')
+    @click.option('--dry-run', is_flag=True, help='Report without moving files or saving checkpoints.')
+    def reconcile_uploads(limit, batch_size, dry_run):
+        """Quarantine orphaned uploads and flag entries whose photo is missing."""
+        from app.journal import reconcile
+        
+        orphans = reconcile.quarantine_orphans(limit, batch_size, dry_run)
+        click.echo(f"Examined {orphans['examined']} files, "
+                   f"{'found' if dry_run else 'quarantined'} {orphans['quarantined']} orphans.")
+        
+        missing = reconcile.find_missing(limit, batch_size, dry_run)
+        for entry_id, photo_path in missing['missing']:
+            click.echo(f'MISSING entry {entry_id}: {photo_path}')
+        click.echo(f"Examined {missing['examined']} entries, {len(missing['missing'])} missing photos.")
+    
+    @app.cli.command('reprocess-photos')
+    @click.option('--workers', type=int, default=None,
+                  help='Worker processes (default: number of cores).')
+    @click.option('--batch-size', default=200, show_default=True,
+                  help='Photos per batch and per database commit.')
+    @click.option('--max-per-second', type=float, default=None,
+                  help='Throttle to at most this many photos per second.')
+    @click.option('--limit', type=int, default=None,
+                  help='Stop after this many photos; the next run resumes where this one stopped.')
+    def reprocess_photos(workers, batch_size, max_per_second, limit):
+        """Re-run the image pipeline over stored photos with the current settings."""
+        from app.journal.reprocess import reprocess_library
+        
+        stats = reprocess_library(workers, batch_size, max_per_second, limit)
+        
+        rate = stats['processed'] / stats['seconds'] if stats['seconds'] else 0
+        saved = stats['bytes_before'] - stats['bytes_after']
+        click.echo(f"Processed {stats['processed']} photos in {stats['seconds']:.1f}s "
+                   f"({rate:.1f}/s): {stats['replaced']} replaced, {stats['failed']} failed.")
+        click.echo(f"Bytes: {stats['bytes_before']} -> {stats['bytes_after']} "
+                   f"({saved / 1024 / 1024:.2f} MiB saved).")
+    
+    @app.cli.command('backfill-photo-info')
+    @click.option('--batch-size', default=500, show_default=True,
+                  help='Entries per database commit.')
+    def backfill_photo_info(batch_size):
+        """Record dimensions, loading placeholders and hashes for photos that lack them."""
+        from app.journal.reprocess import backfill_photo_info
+        
+        stats = backfill_photo_info(batch_size)
+        click.echo(f"Updated {stats['updated']} entries; {stats['missing']} photos could not be read.")
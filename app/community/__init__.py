@@ -3,4 +3,4 @@ from flask import Blueprint
 
 bp = Blueprint('community', __name__)
 
-from app.community import routes
+from app.community import routes, timeline, feeds, leaderboard, reactions
@@ -0,0 +1,225 @@
+"""Per-community feeds: maintenance, reading and a short-lived first-page cache."""
+import time
+from contextlib import nullcontext
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, event, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import (Community, JournalEntry, Sunflower, User, community_feed_table,
+                        community_members)
+from app.pagination import paginate_keyset
+from app.read_models import note_excerpt, to_cards
+
+# First feed page per community: community_id -> (expires, cards, next_cursor)
+_cache = {}
+
+
+def feed_tables():
+    """The community_feed table on the main database and on every configured bind."""
+    bind_keys = [None, *current_app.config.get('SQLALCHEMY_BINDS', {})]
+    return [community_feed_table(bind_key) for bind_key in bind_keys]
+
+
+def _source(*conditions):
+    """SELECT producing (bind_key, feed row) pairs for public entries of community members."""
+    return select(
+        Community.bind_key,
+        community_members.c.community_id, JournalEntry.id.label('entry_id'), Sunflower.user_id,
+        JournalEntry.sunflower_id, JournalEntry.date, JournalEntry.created_at,
+        User.display_name, Sunflower.name.label('sunflower_name'),
+        note_excerpt(JournalEntry.note).label('note_excerpt'), JournalEntry.height_cm,
+        JournalEntry.photo_path, JournalEntry.photo_width, JournalEntry.photo_height,
+        JournalEntry.photo_placeholder, JournalEntry.reaction_count,
+    ) \
+        .join(Sunflower, JournalEntry.sunflower_id == Sunflower.id) \
+        .join(User, Sunflower.user_id == User.id) \
+        .join(community_members, community_members.c.user_id == User.id) \
+        .join(Community, Community.id == community_members.c.community_id) \
+        .where(JournalEntry.is_public.is_(True), *conditions)
+
+
+# Feed table column names, in _source() order after the bind key
+_ROW_KEYS = [column.name for column in _source().selected_columns][1:]
+
+
+def _write(session, rows):
+    """Insert feed rows into the table on each row's community bind."""
+    by_bind = {}
+    for bind_key, *values in rows:
+        by_bind.setdefault(bind_key, []).append(dict(zip(_ROW_KEYS, values)))
+    
+    for bind_key, values in by_bind.items():
+        table = community_feed_table(bind_key)
+        _connection(session, table).execute(insert(table), values)
+
+
+def _connection(session, table):
+    """Session connection to the bind holding `table`, joined to the current transaction."""
+    return session.connection(bind_arguments={'clause': table})
+
+
+def refresh_entries(session, entry_ids):
+    """Re-derive the community feed rows for the given entries."""
+    if not entry_ids:
+        return
+    entry_ids = list(entry_ids)
+    for table in feed_tables():
+        _connection(session, table).execute(delete(table).where(table.c.entry_id.in_(entry_ids)))
+    _write(session, session.connection().execute(_source(JournalEntry.id.in_(entry_ids))))
+
+
+def rebuild_community(session, community):
+    """Recompute one community's feed from its members' entries."""
+    table = community.feed_table
+    _connection(session, table).execute(delete(table).where(table.c.community_id == community.id))
+    _write(session, session.connection().execute(
+        _source(community_members.c.community_id == community.id)))
+
+
+def set_reaction_counts(session, counts):
+    """
+    Copy entries' reaction counts into the community feeds.
+    
+    Args:
+        session: Session whose transaction the updates join
+        counts: List of {'b_entry_id': ..., 'b_count': ...} parameter dicts
+    """
+    for table in feed_tables():
+        _connection(session, table).execute(
+            update(table).where(table.c.entry_id == bindparam('b_entry_id'))
+            .values(reaction_count=bindparam('b_count')), counts)
+    _touched(session)
+
+
+def _touched(session, community_ids=None):
+    """Remember which cached first pages to drop once the transaction commits."""
+    touched = session.info.setdefault('community_feeds_touched', set())
+    if community_ids is None:
+        touched.add(None)  # everything
+    else:
+        touched.update(community_ids)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_community_feeds(session, flush_context):
+    """Apply entry, membership, name and deletion changes to the community feeds."""
+    entry_ids = set()
+    
+    for obj in session.new:
+        if isinstance(obj, JournalEntry):
+            entry_ids.add(obj.id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, JournalEntry) and session.is_modified(obj):
+            entry_ids.add(obj.id)
+        elif isinstance(obj, Sunflower) and inspect(obj).attrs.name.history.has_changes():
+            for table in feed_tables():
+                _connection(session, table).execute(
+                    update(table).where(table.c.sunflower_id == obj.id).values(sunflower_name=obj.name))
+            _touched(session)
+        elif isinstance(obj, User):
+            if inspect(obj).attrs.display_name.history.has_changes():
+                for table in feed_tables():
+                    _connection(session, table).execute(
+                        update(table).where(table.c.user_id == obj.id)
+                        .values(display_name=obj.display_name))
+                _touched(session)
+    
+    # Joining adds the member's existing entries; leaving removes them
+    for obj in session.new | session.dirty:
+        if not isinstance(obj, User):
+            continue
+        joined, _, left = inspect(obj).attrs.communities.history
+        for community in left:
+            table = community.feed_table
+            _connection(session, table).execute(delete(table).where(
+                table.c.community_id == community.id, table.c.user_id == obj.id))
+        if joined:
+            joined_ids = [community.id for community in joined]
+            _write(session, session.connection().execute(_source(
+                Sunflower.user_id == obj.id, community_members.c.community_id.in_(joined_ids))))
+        _touched(session, [community.id for community in (*joined, *left)])
+    
+    for obj in session.deleted:
+        if isinstance(obj, JournalEntry):
+            entry_ids.add(obj.id)
+        elif isinstance(obj, User):
+            for table in feed_tables():
+                _connection(session, table).execute(delete(table).where(table.c.user_id == obj.id))
+            _touched(session)
+        elif isinstance(obj, Community):
+            table = obj.feed_table
+            _connection(session, table).execute(delete(table).where(table.c.community_id == obj.id))
+            _touched(session, [obj.id])
+    
+    if entry_ids:
+        refresh_entries(session, entry_ids)
+        _touched(session)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_cache(session):
+    """Drop this process's cached first pages for communities changed by the commit."""
+    touched = session.info.pop('community_feeds_touched', ())
+    if None in touched:
+        _cache.clear()
+    for community_id in touched:
+        _cache.pop(community_id, None)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_touched(session):
+    session.info.pop('community_feeds_touched', None)
+
+
+def _page(community, cursor, per_page):
+    """Load one batch of a community's feed starting after `cursor`."""
+    table = community.feed_table
+    # Reads on another bind need their own session: SELECTs are not routed by table
+    reader = Session(db.engines[community.bind_key]) if community.bind_key else nullcontext(db.session)
+    with reader as session:
+        return _page_from(session, table, community, cursor, per_page)
+
+
+def _page_from(session, table, community, cursor, per_page):
+    """_page on a given session."""
+    query = session.query(
+        table.c.entry_id, table.c.sunflower_id, table.c.date, table.c.created_at,
+        table.c.note_excerpt, table.c.height_cm, table.c.photo_path,
+        table.c.photo_width, table.c.photo_height, table.c.photo_placeholder,
+        literal(True), table.c.display_name, table.c.sunflower_name, table.c.reaction_count,
+    ).filter(table.c.community_id == community.id)
+    
+    rows, next_cursor = paginate_keyset(
+        query, (table.c.date, table.c.created_at, table.c.entry_id), cursor, per_page)
+    return to_cards(rows), next_cursor
+
+
+def community_feed_page(community, cursor=None):
+    """
+    One page of a community's feed, newest first.
+    
+    The first page is cached in-process for COMMUNITY_FEED_CACHE_TTL
+    seconds; commits that touch the community drop it early in the
+    worker that made them.
+    
+    Args:
+        community: Community to read
+        cursor: Cursor from a previous page, or None for the first page
+    
+    Returns:
+        tuple: (EntryCards, next_cursor)
+    """
+    config = current_app.config
+    if cursor or not config['COMMUNITY_FEED_CACHE_TTL']:
+        return _page(community, cursor, config['ENTRIES_PER_PAGE'])
+    
+    cached = _cache.get(community.id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    
+    cards, next_cursor = _page(community, None, config['ENTRIES_PER_PAGE'])
+    _cache[community.id] = (time.monotonic() + config['COMMUNITY_FEED_CACHE_TTL'], cards, next_cursor)
+    return cards, next_cursor
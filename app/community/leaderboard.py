@@ -0,0 +1,220 @@
+"""Tallest-sunflowers leaderboard backed by per-season maximum heights."""
+import time
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import and_, delete, event, extract, func, insert, inspect, select, union_all, update
+
+from app import db
+from app.models import ArchivedEntry, JournalEntry, SeasonHeight, Sunflower, User
+
+# Board per (season, size): (expires, rows)
+_cache = {}
+
+
+def current_season(today=None):
+    """The season (calendar year) `today` falls in."""
+    return (today or date.today()).year
+
+
+def _key(sunflower_id, day):
+    """Leaderboard row an entry of `sunflower_id` dated `day` counts toward."""
+    return sunflower_id, day.year
+
+
+def _where(sunflower_id, season):
+    """Condition selecting one SeasonHeight row."""
+    return and_(SeasonHeight.sunflower_id == sunflower_id, SeasonHeight.season == season)
+
+
+def season_max(connection, sunflower_id, season):
+    """
+    Tallest public height a sunflower reached in a season, from its entries.
+    
+    Reads live and archived entries, each through its (sunflower_id, date)
+    index, so past seasons keep their standings after archiving.
+    
+    Returns:
+        float: Height in cm, or None if no public entry recorded one
+    """
+    start, end = date(season, 1, 1), date(season + 1, 1, 1)
+    heights = [connection.scalar(
+        select(func.max(model.height_cm))
+        .where(model.sunflower_id == sunflower_id, model.date >= start, model.date < end,
+               model.is_public.is_(True)))
+        for model in (JournalEntry, ArchivedEntry)]
+    heights = [height for height in heights if height is not None]
+    return max(heights) if heights else None
+
+
+def recompute(connection, key):
+    """Re-derive one (sunflower_id, season) row from the entries."""
+    height = season_max(connection, *key)
+    connection.execute(delete(SeasonHeight).where(_where(*key)))
+    if height is not None:
+        connection.execute(insert(SeasonHeight).values(
+            sunflower_id=key[0], season=key[1], max_height_cm=height))
+
+
+def raise_to(connection, key, height):
+    """Record `height` for (sunflower_id, season) unless the stored maximum is already higher."""
+    raised = connection.execute(update(SeasonHeight)
+                                .where(_where(*key), SeasonHeight.max_height_cm < height)
+                                .values(max_height_cm=height))
+    if raised.rowcount == 0 and connection.scalar(
+            select(SeasonHeight.max_height_cm).where(_where(*key))) is None:
+        connection.execute(insert(SeasonHeight).values(
+            sunflower_id=key[0], season=key[1], max_height_cm=height))
+
+
+def rebuild_range(connection, first_id, last_id):
+    """Recompute every season for sunflowers with ids in [first_id, last_id]."""
+    connection.execute(delete(SeasonHeight).where(SeasonHeight.sunflower_id.between(first_id, last_id)))
+    heights = union_all(*[
+        select(model.sunflower_id, extract('year', model.date).label('season'), model.height_cm)
+        .where(model.sunflower_id.between(first_id, last_id), model.height_cm.is_not(None),
+               model.is_public.is_(True))
+        for model in (JournalEntry, ArchivedEntry)]).subquery()
+    connection.execute(insert(SeasonHeight).from_select(
+        ['sunflower_id', 'season', 'max_height_cm'],
+        select(heights.c.sunflower_id, heights.c.season, func.max(heights.c.height_cm))
+        .group_by(heights.c.sunflower_id, heights.c.season)))
+
+
+def _counted_height(height, is_public):
+    """The height an entry contributes to the board."""
+    return height if is_public else None
+
+
+def _previous(obj, name):
+    """Value of an attribute before this flush."""
+    deleted = inspect(obj).attrs[name].history.deleted
+    return deleted[0] if deleted else getattr(obj, name)
+
+
+def _keep_previous(target, value, oldvalue, initiator):
+    """No-op; registering it makes the attribute load its old value before a change."""
+
+
+# Without active history, assigning to an expired attribute records no
+# old value, and a change could not tell which row it moved away from
+for _attribute in (JournalEntry.sunflower_id, JournalEntry.date, JournalEntry.height_cm,
+                   JournalEntry.is_public):
+    event.listen(_attribute, 'set', _keep_previous, active_history=True)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_season_heights(session, flush_context):
+    """
+    Keep season maxima in step with entry changes in the same transaction.
+    
+    A new or raised height can only raise its row, which is a single
+    conditional UPDATE. Only a height that may have been the maximum and
+    went away (deleted, lowered, made private or moved to another season)
+    makes the season be recomputed from its entries.
+    """
+    connection = session.connection()
+    raises, stale, touched = {}, set(), set()
+    
+    def raise_key(key, height):
+        if height is not None and height > raises.get(key, float('-inf')):
+            raises[key] = height
+    
+    for obj in session.new:
+        if isinstance(obj, JournalEntry):
+            raise_key(_key(obj.sunflower_id, obj.date),
+                      _counted_height(obj.height_cm, obj.is_public))
+    
+    for obj in session.dirty:
+        if not isinstance(obj, JournalEntry) or not session.is_modified(obj):
+            continue
+        old_key = _key(_previous(obj, 'sunflower_id'), _previous(obj, 'date'))
+        old = _counted_height(_previous(obj, 'height_cm'), _previous(obj, 'is_public'))
+        key = _key(obj.sunflower_id, obj.date)
+        new = _counted_height(obj.height_cm, obj.is_public)
+        if old is not None and (key != old_key or new is None or new < old):
+            stale.add(old_key)
+        raise_key(key, new)
+    
+    for obj in session.deleted:
+        if isinstance(obj, JournalEntry):
+            height = _counted_height(obj.height_cm, obj.is_public)
+            key = _key(obj.sunflower_id, obj.date)
+            stored = connection.scalar(select(SeasonHeight.max_height_cm).where(_where(*key)))
+            if height is not None and stored is not None and height >= stored:
+                stale.add(key)
+    
+    for key in stale:
+        recompute(connection, key)
+    for key, height in raises.items():
+        if key not in stale:
+            raise_to(connection, key, height)
+    touched.update(season for _, season in (*stale, *raises))
+    
+    # A deleted sunflower's rows go with it (Sunflower.season_heights cascade)
+    if any(isinstance(obj, Sunflower) for obj in session.deleted):
+        touched.add(None)
+    
+    if touched:
+        session.info.setdefault('leaderboard_touched', set()).update(touched)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_cache(session):
+    """Drop this process's cached boards for seasons changed by the commit."""
+    touched = session.info.pop('leaderboard_touched', ())
+    if None in touched:
+        _cache.clear()
+        return
+    for key in [key for key in _cache if key[0] in touched]:
+        _cache.pop(key, None)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_touched(session):
+    session.info.pop('leaderboard_touched', None)
+
+
+def tallest(season=None, size=None):
+    """
+    The tallest sunflowers of a season, tallest first.
+    
+    Served from the (season, max_height_cm) index; results for the
+    current season and for seasons with heights are cached in-process
+    for LEADERBOARD_CACHE_TTL seconds and dropped early by commits that
+    change the season in this worker.
+    
+    Args:
+        season: Calendar year (defaults to the current season)
+        size: Number of sunflowers (defaults to LEADERBOARD_SIZE)
+    
+    Returns:
+        list: Rows of (sunflower_id, sunflower_name, display_name, height_cm)
+    """
+    config = current_app.config
+    if season is None:
+        season = current_season()
+    if size is None:
+        size = config['LEADERBOARD_SIZE']
+    
+    cached = _cache.get((season, size))
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    rows = db.session.query(
+        SeasonHeight.sunflower_id, Sunflower.name.label('sunflower_name'), User.display_name,
+        SeasonHeight.max_height_cm.label('height_cm'),
+    ) \
+        .join(Sunflower, SeasonHeight.sunflower_id == Sunflower.id) \
+        .join(User, Sunflower.user_id == User.id) \
+        .filter(SeasonHeight.season == season) \
+        .order_by(SeasonHeight.max_height_cm.desc(), SeasonHeight.sunflower_id.desc()) \
+        .limit(size) \
+        .all()
+    # Only boards that can be asked for again are kept, so the cache stays bounded
+    if config['LEADERBOARD_CACHE_TTL'] and (rows or season == current_season()):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in _cache.items() if expires <= now]:
+            del _cache[key]
+        _cache[(season, size)] = (now + config['LEADERBOARD_CACHE_TTL'], rows)
+    return rows
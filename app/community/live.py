@@ -0,0 +1,135 @@
+"""Live community feed updates over server-sent events."""
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import FeedItem
+from app.read_models import feed_card_query, to_cards
+
+
+class Subscription:
+    """One SSE client's bounded queue of pending feed items."""
+    
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+    
+    def get(self, timeout):
+        """Next feed item, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class FeedBroker:
+    """
+    Fan out new feed timeline rows to SSE subscribers in this process.
+    
+    Each worker process runs a single poller thread that watches
+    feed_timeline for rows published since its last poll. Because every
+    worker polls the shared database, a post committed by one gunicorn
+    worker reaches subscribers connected to all of them, while idle
+    clients cost only a queue each. The poller stops when the last
+    subscriber leaves and restarts on the next subscription.
+    
+    Publication times are stamped at flush, not commit, so a row can
+    appear with a time before the last one already seen. Each poll
+    re-reads the last FEED_LIVE_OVERLAP seconds and skips the entries it
+    already published.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.subscribers = set()
+        self.watermark = None
+        self.seen = {}  # entry_id -> published_at, for rows inside the overlap window
+        self._lock = threading.Lock()
+        self._poller = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Attach the broker to an app."""
+        self.app = app
+        app.extensions['feed_broker'] = self
+    
+    def subscribe(self):
+        """Register a new client and make sure the poller is running."""
+        subscription = Subscription(self.app.config['FEED_LIVE_QUEUE_SIZE'])
+        with self._lock:
+            self.subscribers.add(subscription)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._run, name='feed-broker', daemon=True)
+                self._poller.start()
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        """Forget a client whose stream has ended."""
+        with self._lock:
+            self.subscribers.discard(subscription)
+    
+    def publish(self, items):
+        """
+        Queue items for every subscriber.
+        
+        A client that has fallen a full queue behind is dropped rather than
+        buffered without limit; its stream ends and the browser's
+        EventSource reconnects from the live edge.
+        """
+        with self._lock:
+            for subscription in list(self.subscribers):
+                for item in items:
+                    try:
+                        subscription.queue.put_nowait(item)
+                    except queue.Full:
+                        subscription.dropped = True
+                        self.subscribers.discard(subscription)
+                        break
+    
+    def poll_once(self):
+        """Publish timeline rows committed since the last poll (needs an app context)."""
+        if self.watermark is None:
+            self.watermark = db.session.scalar(select(func.max(FeedItem.published_at))) or datetime.utcnow()
+            return []
+        
+        since = self.watermark - timedelta(seconds=self.app.config['FEED_LIVE_OVERLAP'])
+        rows = feed_card_query() \
+            .add_columns(FeedItem.published_at) \
+            .filter(FeedItem.published_at > since) \
+            .order_by(FeedItem.published_at, FeedItem.entry_id) \
+            .limit(self.app.config['FEED_LIVE_QUEUE_SIZE'] + len(self.seen)) \
+            .all()
+        fresh = [row for row in rows if row[0] not in self.seen]
+        for row in fresh:
+            self.seen[row[0]] = row[-1]
+        if rows:
+            self.watermark = max(self.watermark, rows[-1][-1])
+        since = self.watermark - timedelta(seconds=self.app.config['FEED_LIVE_OVERLAP'])
+        self.seen = {entry_id: published for entry_id, published in self.seen.items() if published > since}
+        
+        items = to_cards(row[:-1] for row in fresh)
+        if items:
+            self.publish(items)
+        return items
+    
+    def _run(self):
+        """Poller thread body; exits once nobody is listening."""
+        while True:
+            with self._lock:
+                if not self.subscribers:
+                    self._poller = None
+                    self.watermark = None
+                    self.seen = {}
+                    return
+            
+            with self.app.app_context():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    self.app.logger.error(f"Error polling feed timeline: {e}")
+            time.sleep(self.app.config['FEED_LIVE_POLL_INTERVAL'])
@@ -0,0 +1,161 @@
+"""Entry reactions and their write-coalesced counters."""
+import threading
+
+from sqlalchemy import bindparam, delete, event, func, or_, select, union, update
+
+from app import db
+from app.community import feeds
+from app.models import ArchivedEntry, FeedItem, JournalEntry, Reaction, Sunflower, User
+
+
+def recount(session, entry_ids):
+    """
+    Recount reactions for the given entries and store the totals.
+    
+    Counts are recomputed from the reactions table rather than adjusted,
+    so a lost or repeated recount can never drift. One UPDATE per table
+    covers the whole batch.
+    
+    Args:
+        session: Session whose transaction the updates join
+        entry_ids: Entries whose reactions changed
+    """
+    entry_ids = list(entry_ids)
+    if not entry_ids:
+        return
+    connection = session.connection()
+    totals = dict(connection.execute(
+        select(Reaction.entry_id, func.count())
+        .where(Reaction.entry_id.in_(entry_ids))
+        .group_by(Reaction.entry_id)).all())
+    counts = [{'b_entry_id': entry_id, 'b_count': totals.get(entry_id, 0)} for entry_id in entry_ids]
+    
+    entries, timeline = JournalEntry.__table__, FeedItem.__table__
+    # Keep updated_at: a reaction is not an edit (and must not change the timelapse revision)
+    connection.execute(update(entries).where(entries.c.id == bindparam('b_entry_id'))
+                       .values(reaction_count=bindparam('b_count'), updated_at=entries.c.updated_at), counts)
+    connection.execute(update(timeline).where(timeline.c.entry_id == bindparam('b_entry_id'))
+                       .values(reaction_count=bindparam('b_count')), counts)
+    feeds.set_reaction_counts(session, counts)
+
+
+def reacted_ids(user, entries):
+    """Ids of the given entries (anything with an `id`) that `user` reacted to, in one query."""
+    ids = [entry.id for entry in entries]
+    if not ids:
+        return set()
+    return set(db.session.scalars(select(Reaction.entry_id)
+                                  .where(Reaction.user_id == user.id, Reaction.entry_id.in_(ids))))
+
+
+class ReactionCounter:
+    """
+    Coalesce reaction counter updates in this process.
+    
+    A reaction row is written as soon as the user clicks, but the entry's
+    reaction_count (and its feed copies) is only brought up to date by a
+    background flush that recounts every entry touched since the last one.
+    A popular entry clicked a hundred times in a flush interval gets one
+    UPDATE instead of a hundred competing for its row lock. The flusher
+    thread runs while there is work and stops when the buffer is empty.
+    
+    Counts shown in the feed can lag by up to REACTION_FLUSH_INTERVAL
+    seconds; a crash loses only the buffer, which `flask recount-reactions`
+    (or the next reaction on the entry) repairs.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Attach the counter to an app."""
+        self.app = app
+        app.extensions['reaction_counter'] = self
+    
+    def record(self, entry_id):
+        """Note that an entry's reactions changed (call after committing the reaction)."""
+        interval = self.app.config['REACTION_FLUSH_INTERVAL']
+        if not interval:
+            # Unbuffered: count straight away
+            recount(db.session, [entry_id])
+            db.session.commit()
+            return
+        
+        with self._lock:
+            self.pending.add(entry_id)
+            if len(self.pending) >= self.app.config['REACTION_FLUSH_SIZE']:
+                self._wake.set()
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='reaction-counter', daemon=True)
+                self._flusher.start()
+    
+    def flush(self):
+        """
+        Recount every pending entry in one transaction (needs an app context).
+        
+        Returns:
+            int: Number of entries recounted
+        """
+        with self._lock:
+            entry_ids, self.pending = self.pending, set()
+        if not entry_ids:
+            return 0
+        try:
+            recount(db.session, entry_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self.pending |= entry_ids
+            raise
+        return len(entry_ids)
+    
+    def _run(self):
+        """Flusher thread body; exits once the buffer is empty."""
+        while True:
+            self._wake.wait(self.app.config['REACTION_FLUSH_INTERVAL'])
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    self.app.logger.error(f"Error flushing reaction counts: {e}")
+            
+            with self._lock:
+                if not self.pending:
+                    self._flusher = None
+                    return
+
+
+@event.listens_for(db.session, 'before_flush')
+def _drop_reactions(session, flush_context, instances):
+    """
+    Delete reactions on entries about to be deleted and by users about to be deleted.
+    
+    Runs before the flush so no reaction outlives the user it references;
+    entries deleted through their sunflower are found by sunflower.
+    """
+    entry_ids = [obj.id for obj in session.deleted if isinstance(obj, JournalEntry)]
+    sunflower_ids = [obj.id for obj in session.deleted if isinstance(obj, Sunflower)]
+    user_ids = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    if not (entry_ids or sunflower_ids or user_ids):
+        return
+    
+    connection = session.connection()
+    conditions = [Reaction.entry_id.in_(entry_ids), Reaction.user_id.in_(user_ids)]
+    if sunflower_ids:
+        conditions.append(Reaction.entry_id.in_(union(
+            select(JournalEntry.id).where(JournalEntry.sunflower_id.in_(sunflower_ids)),
+            select(ArchivedEntry.id).where(ArchivedEntry.sunflower_id.in_(sunflower_ids)))))
+    reacted = connection.scalars(select(Reaction.entry_id).where(Reaction.user_id.in_(user_ids))).all() \
+        if user_ids else []
+    
+    connection.execute(delete(Reaction).where(or_(*conditions)))
+    # What the deleted users reacted to now has fewer reactions
+    recount(session, set(reacted) - set(entry_ids))
@@ -1,28 +1,181 @@
 """Community routes."""
-from flask import render_template, request
-from flask_login import login_required
+from datetime import date
 
+from flask import (render_template, request, current_app, Response, stream_with_context,
+                   redirect, url_for, flash, abort)
+from flask_login import login_required, current_user
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
 from app.community import bp
-from app.models import JournalEntry, Sunflower, User
+from app.community.feeds import community_feed_page
+from app.community.leaderboard import current_season, tallest
+from app.community.reactions import reacted_ids
+from app.models import Community, FeedItem, JournalEntry, Reaction
+from app.pagination import paginate_keyset
+from app.read_models import feed_card_query, to_cards
+
+# Newest first; entry id breaks ties between entries created in the same instant
+FEED_ORDER = (FeedItem.date, FeedItem.created_at, FeedItem.entry_id)
+
+
+def _feed_page(cursor):
+    """Load one batch of the feed timeline starting after `cursor`."""
+    rows, next_cursor = paginate_keyset(feed_card_query(), FEED_ORDER, cursor,
+                                        current_app.config['ENTRIES_PER_PAGE'])
+    return to_cards(rows), next_cursor
 
 
 @bp.route('/')
 @login_required
 def feed():
     """Community feed of public journal entries."""
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    
-    # Query public entries from all users, ordered by date
-    pagination = JournalEntry.query \
-        .filter_by(is_public=True) \
-        .join(Sunflower) \
-        .join(User) \
-        .order_by(JournalEntry.date.desc(), JournalEntry.created_at.desc()) \
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    entries = pagination.items
-    
-    return render_template('community/feed.html', 
-                         entries=entries, 
-                         pagination=pagination)
+    entries, next_cursor = _feed_page(request.args.get('cursor'))
+    
+    return render_template('community/feed.html',
+                         entries=entries,
+                         next_cursor=next_cursor,
+                         reacted=reacted_ids(current_user, entries))
+
+
+@bp.route('/entries')
+@login_required
+def feed_entries():
+    """Next batch of feed cards for infinite scroll (HTMX fragment, no layout)."""
+    entries, next_cursor = _feed_page(request.args.get('cursor'))
+    
+    return render_template('community/_entries.html',
+                         entries=entries,
+                         next_cursor=next_cursor,
+                         reacted=reacted_ids(current_user, entries))
+
+
+@bp.route('/tallest')
+@login_required
+def leaderboard():
+    """Tallest sunflowers of a season (the current one by default)."""
+    season = request.args.get('season', current_season(), type=int)
+    if not date.min.year <= season < date.max.year:
+        abort(404)
+    
+    return render_template('community/tallest.html', season=season,
+                         standings=tallest(season), this_season=current_season())
+
+
+@bp.route('/groups')
+@login_required
+def groups():
+    """Communities the user can join or leave."""
+    communities = Community.query.order_by(Community.name).all()
+    joined = {community.id for community in current_user.communities}
+    
+    return render_template('community/groups.html', communities=communities, joined=joined)
+
+
+@bp.route('/c/<slug>/')
+@login_required
+def community_feed(slug):
+    """Feed of one community's members."""
+    community = Community.query.filter_by(slug=slug).first_or_404()
+    entries, next_cursor = community_feed_page(community, request.args.get('cursor'))
+    
+    return render_template('community/feed.html', community=community,
+                         entries=entries, next_cursor=next_cursor,
+                         reacted=reacted_ids(current_user, entries))
+
+
+@bp.route('/c/<slug>/entries')
+@login_required
+def community_entries(slug):
+    """Next batch of a community feed for infinite scroll (HTMX fragment, no layout)."""
+    community = Community.query.filter_by(slug=slug).first_or_404()
+    entries, next_cursor = community_feed_page(community, request.args.get('cursor'))
+    
+    return render_template('community/_entries.html', community=community,
+                         entries=entries, next_cursor=next_cursor,
+                         reacted=reacted_ids(current_user, entries))
+
+
+@bp.route('/c/<slug>/join', methods=['POST'])
+@login_required
+def join(slug):
+    """Join a community; your public entries appear in its feed."""
+    community = Community.query.filter_by(slug=slug).first_or_404()
+    if community not in current_user.communities:
+        current_user.communities.append(community)
+        db.session.commit()
+        flash(f'You joined {community.name}.', 'success')
+    return redirect(url_for('community.community_feed', slug=slug))
+
+
+@bp.route('/c/<slug>/leave', methods=['POST'])
+@login_required
+def leave(slug):
+    """Leave a community; your entries are removed from its feed."""
+    community = Community.query.filter_by(slug=slug).first_or_404()
+    if community in current_user.communities:
+        current_user.communities.remove(community)
+        db.session.commit()
+        flash(f'You left {community.name}.', 'info')
+    return redirect(url_for('community.groups'))
+
+
+@bp.route('/entry/<int:entry_id>/react', methods=['POST'])
+@login_required
+def react(entry_id):
+    """Toggle the user's sunflower on a shared entry."""
+    if not db.session.scalar(select(JournalEntry.is_public).where(JournalEntry.id == entry_id)):
+        abort(404)
+    
+    reaction = Reaction.query.filter_by(user_id=current_user.id, entry_id=entry_id).first()
+    if reaction:
+        db.session.delete(reaction)
+    else:
+        db.session.add(Reaction(user_id=current_user.id, entry_id=entry_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A double click already added it
+        db.session.rollback()
+    current_app.extensions['reaction_counter'].record(entry_id)
+    
+    if not request.headers.get('HX-Request'):
+        return redirect(request.referrer or url_for('community.feed'))
+    
+    # Exact for the clicker; the stored count catches up at the next flush
+    count = db.session.scalar(select(func.count()).where(Reaction.entry_id == entry_id))
+    return render_template('community/_reaction.html', entry_id=entry_id, count=count,
+                         reacted=reaction is None)
+
+
+@bp.route('/live')
+@login_required
+def live():
+    """Server-sent event stream of newly shared entries."""
+    broker = current_app.extensions['feed_broker']
+    heartbeat = current_app.config['FEED_LIVE_HEARTBEAT']
+    subscription = broker.subscribe()
+    
+    # Idle streams must not pin a database connection
+    db.session.remove()
+    
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while not subscription.dropped:
+                item = subscription.get(timeout=heartbeat)
+                if item is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                
+                html = render_template('community/_entries.html', entries=[item], next_cursor=None,
+                                       reacted=())
+                data = ''.join(f'data: {line}\n' for line in html.splitlines())
+                yield f'event: entry\nid: {item.id}\n{data}\n'
+        finally:
+            broker.unsubscribe(subscription)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
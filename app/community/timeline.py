@@ -0,0 +1,91 @@
+"""Maintenance of the denormalized community feed timeline."""
+from datetime import datetime
+
+from sqlalchemy import delete, event, insert, inspect, select, update
+
+from app import db
+from app.models import FeedItem, JournalEntry, Sunflower, User
+from app.read_models import note_excerpt
+
+TIMELINE_COLUMNS = (
+    'entry_id', 'sunflower_id', 'user_id', 'date', 'created_at',
+    'display_name', 'sunflower_name', 'note_excerpt', 'height_cm', 'photo_path',
+    'photo_width', 'photo_height', 'photo_placeholder', 'reaction_count', 'published_at',
+)
+
+
+def _timeline_source():
+    """SELECT producing timeline rows for public entries, in TIMELINE_COLUMNS order."""
+    return select(
+        JournalEntry.id, JournalEntry.sunflower_id, Sunflower.user_id,
+        JournalEntry.date, JournalEntry.created_at, User.display_name,
+        Sunflower.name, note_excerpt(JournalEntry.note), JournalEntry.height_cm, JournalEntry.photo_path,
+        JournalEntry.photo_width, JournalEntry.photo_height, JournalEntry.photo_placeholder,
+        JournalEntry.reaction_count, JournalEntry.published_at,
+    ) \
+        .join(Sunflower, JournalEntry.sunflower_id == Sunflower.id) \
+        .join(User, Sunflower.user_id == User.id) \
+        .where(JournalEntry.is_public.is_(True))
+
+
+def refresh_entries(connection, entry_ids):
+    """Re-derive the timeline rows for the given entries."""
+    if not entry_ids:
+        return
+    entry_ids = list(entry_ids)
+    connection.execute(delete(FeedItem).where(FeedItem.entry_id.in_(entry_ids)))
+    connection.execute(insert(FeedItem).from_select(
+        TIMELINE_COLUMNS, _timeline_source().where(JournalEntry.id.in_(entry_ids))))
+
+
+def rebuild_range(connection, first_id, last_id):
+    """Re-derive the timeline rows for entry ids in [first_id, last_id]."""
+    connection.execute(delete(FeedItem).where(FeedItem.entry_id.between(first_id, last_id)))
+    connection.execute(insert(FeedItem).from_select(
+        TIMELINE_COLUMNS,
+        _timeline_source().where(JournalEntry.id.between(first_id, last_id))))
+
+
+@event.listens_for(JournalEntry.is_public, 'set', active_history=True)
+def _stamp_published(target, value, oldvalue, initiator):
+    """Date an entry's publication when a private one is made public."""
+    if value and oldvalue is False:
+        target.published_at = datetime.utcnow()
+
+
+def _changed(obj, attr):
+    """Whether `attr` was modified on `obj` in the current flush."""
+    return inspect(obj).attrs[attr].history.has_changes()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_timeline(session, flush_context):
+    """Apply entry, sunflower and user changes to the timeline in the same transaction."""
+    entry_ids = set()
+    connection = session.connection()
+    
+    for obj in session.new:
+        if isinstance(obj, JournalEntry):
+            entry_ids.add(obj.id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, JournalEntry) and session.is_modified(obj):
+            entry_ids.add(obj.id)
+        elif isinstance(obj, Sunflower) and _changed(obj, 'name'):
+            connection.execute(update(FeedItem)
+                               .where(FeedItem.sunflower_id == obj.id)
+                               .values(sunflower_name=obj.name))
+        elif isinstance(obj, User) and _changed(obj, 'display_name'):
+            connection.execute(update(FeedItem)
+                               .where(FeedItem.user_id == obj.id)
+                               .values(display_name=obj.display_name))
+    
+    for obj in session.deleted:
+        if isinstance(obj, JournalEntry):
+            connection.execute(delete(FeedItem).where(FeedItem.entry_id == obj.id))
+        elif isinstance(obj, Sunflower):
+            connection.execute(delete(FeedItem).where(FeedItem.sunflower_id == obj.id))
+        elif isinstance(obj, User):
+            connection.execute(delete(FeedItem).where(FeedItem.user_id == obj.id))
+    
+    refresh_entries(connection, entry_ids)
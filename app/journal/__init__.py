@@ -3,4 +3,4 @@ from flask import Blueprint
 
 bp = Blueprint('journal', __name__)
 
-from app.journal import routes
+from app.journal import routes, buckets
@@ -0,0 +1,134 @@
+"""Move past seasons' journal entries between journal_entries and the archive table."""
+from datetime import date
+
+from sqlalchemy import delete, insert, select, union_all, update
+
+from app import db
+from app.community import feeds, timeline
+from app.journal.buckets import refresh_buckets
+from app.models import ArchivedEntry, FeedItem, JournalEntry
+from app.sync import next_revision
+
+# Columns shared by both tables, copied as-is in either direction
+COLUMNS = tuple(column.name for column in JournalEntry.__table__.columns)
+
+
+def season_cutoff(today, keep_seasons):
+    """
+    First day that stays in the hot table.
+    
+    A season is a calendar year; the current season and the
+    `keep_seasons - 1` before it are kept.
+    """
+    return date(today.year - max(keep_seasons, 1) + 1, 1, 1)
+
+
+def photo_rows(after_id, limit):
+    """
+    Next entries with a photo, live or archived, in id order.
+    
+    Ids are never reused across the two tables, so maintenance commands
+    can walk both with a single id checkpoint.
+    
+    Returns:
+        list: Up to `limit` rows of (id, photo_path) with id > `after_id`
+    """
+    batches = [select(model.id, model.photo_path)
+               .where(model.id > after_id, model.photo_path.is_not(None))
+               .order_by(model.id)
+               .limit(limit)
+               .subquery()
+               for model in (JournalEntry, ArchivedEntry)]
+    photos = union_all(*[select(batch.c.id, batch.c.photo_path) for batch in batches]).subquery()
+    return db.session.execute(select(photos.c.id, photos.c.photo_path)
+                              .order_by(photos.c.id)
+                              .limit(limit)).all()
+
+
+def _move_batch(source, target, condition, batch_size):
+    """
+    Copy one batch of rows matching `condition` from `source` to `target` and delete them.
+    
+    Returns:
+        tuple: (moved ids, (sunflower_id, date) pairs of the moved rows)
+    """
+    rows = db.session.execute(
+        select(source.id, source.sunflower_id, source.date)
+        .where(condition)
+        .order_by(source.id)
+        .limit(batch_size)
+    ).all()
+    ids = [row.id for row in rows]
+    if ids:
+        source_table, target_table = source.__table__, target.__table__
+        db.session.execute(insert(target_table).from_select(
+            COLUMNS, select(*[source_table.c[name] for name in COLUMNS])
+            .where(source_table.c.id.in_(ids))))
+        db.session.execute(delete(source_table).where(source_table.c.id.in_(ids)))
+    return ids, {(row.sunflower_id, row.date) for row in rows}
+
+
+def archive_entries(before, batch_size=500, sunflower_id=None):
+    """
+    Move entries dated before `before` into the archive.
+    
+    Runs online: each batch moves its rows, drops their global and
+    community feed rows and recomputes the journal summaries they touched
+    in one short transaction. Core statements bypass the session's flush
+    listeners, which is why the read models are updated here explicitly.
+    
+    Args:
+        before: First date to keep in journal_entries
+        batch_size: Entries per transaction
+        sunflower_id: Only archive this sunflower's entries
+    
+    Returns:
+        int: Number of entries archived
+    """
+    condition = JournalEntry.date < before
+    if sunflower_id is not None:
+        condition &= JournalEntry.sunflower_id == sunflower_id
+    
+    moved = 0
+    while True:
+        ids, keys = _move_batch(JournalEntry, ArchivedEntry, condition, batch_size)
+        if not ids:
+            return moved
+        db.session.execute(delete(FeedItem).where(FeedItem.entry_id.in_(ids)))
+        feeds.refresh_entries(db.session, ids)
+        refresh_buckets(db.session.connection(), keys)
+        db.session.commit()
+        moved += len(ids)
+
+
+def restore_entries(since, batch_size=500, sunflower_id=None):
+    """
+    Move archived entries dated on or after `since` back into journal_entries.
+    
+    Args:
+        since: Earliest date to restore
+        batch_size: Entries per transaction
+        sunflower_id: Only restore this sunflower's entries
+    
+    Returns:
+        int: Number of entries restored
+    """
+    condition = ArchivedEntry.date >= since
+    if sunflower_id is not None:
+        condition &= ArchivedEntry.sunflower_id == sunflower_id
+    
+    moved = 0
+    while True:
+        ids, keys = _move_batch(ArchivedEntry, JournalEntry, condition, batch_size)
+        if not ids:
+            return moved
+        # Restored entries are news to their journals' sync clients
+        for restored_id in {key[0] for key in keys}:
+            db.session.execute(update(JournalEntry)
+                               .where(JournalEntry.id.in_(ids), JournalEntry.sunflower_id == restored_id)
+                               .values(rev=next_revision(db.session.connection(), restored_id)))
+        timeline.refresh_entries(db.session.connection(), ids)
+        feeds.refresh_entries(db.session, ids)
+        refresh_buckets(db.session.connection(), keys)
+        db.session.commit()
+        moved += len(ids)
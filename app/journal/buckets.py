@@ -0,0 +1,108 @@
+"""Week and month summaries of journal entries."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, inspect, insert, select
+
+from app import db
+from app.models import JournalBucket, JournalEntry, Sunflower
+
+PERIODS = ('week', 'month')
+
+
+def bucket_start(day, period):
+    """First day of the week (Monday) or month containing `day`."""
+    if isinstance(day, datetime):
+        day = day.date()
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def bucket_end(start, period):
+    """First day after the bucket beginning at `start`."""
+    if period == 'week':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def summarize(rows):
+    """
+    Summarize one bucket's entries.
+    
+    Args:
+        rows: (height_cm, photo_path) tuples in chronological order
+    
+    Returns:
+        dict: entry_count, height_delta and cover_photo column values
+    """
+    heights = [height for height, _ in rows if height is not None]
+    photos = [photo for _, photo in rows if photo]
+    return {
+        'entry_count': len(rows),
+        'height_delta': heights[-1] - heights[0] if len(heights) > 1 else None,
+        'cover_photo': photos[-1] if photos else None,
+    }
+
+
+def refresh_buckets(connection, keys):
+    """
+    Recompute the summaries containing the given entry dates.
+    
+    Args:
+        connection: Connection to run the statements on
+        keys: Iterable of (sunflower_id, date) pairs that changed
+    """
+    starts = {(sunflower_id, period, bucket_start(day, period))
+              for sunflower_id, day in keys for period in PERIODS}
+    
+    for sunflower_id, period, start in starts:
+        rows = connection.execute(
+            select(JournalEntry.height_cm, JournalEntry.photo_path)
+            .where(JournalEntry.sunflower_id == sunflower_id,
+                   JournalEntry.date >= start,
+                   JournalEntry.date < bucket_end(start, period))
+            .order_by(JournalEntry.date, JournalEntry.created_at, JournalEntry.id)
+        ).all()
+        
+        connection.execute(delete(JournalBucket).where(
+            JournalBucket.sunflower_id == sunflower_id,
+            JournalBucket.period == period,
+            JournalBucket.start == start))
+        if rows:
+            connection.execute(insert(JournalBucket).values(
+                sunflower_id=sunflower_id, period=period, start=start, **summarize(rows)))
+
+
+def rebuild_sunflower(connection, sunflower_id):
+    """Recompute every summary for one sunflower."""
+    connection.execute(delete(JournalBucket).where(JournalBucket.sunflower_id == sunflower_id))
+    days = connection.scalars(
+        select(JournalEntry.date).where(JournalEntry.sunflower_id == sunflower_id).distinct())
+    refresh_buckets(connection, [(sunflower_id, day) for day in days])
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_buckets(session, flush_context):
+    """Recompute the summaries touched by entry changes in the same transaction."""
+    keys = set()
+    connection = session.connection()
+    
+    for obj in session.new:
+        if isinstance(obj, JournalEntry):
+            keys.add((obj.sunflower_id, obj.date))
+    
+    for obj in session.dirty:
+        if isinstance(obj, JournalEntry) and session.is_modified(obj):
+            keys.add((obj.sunflower_id, obj.date))
+            # A moved entry also leaves its old bucket
+            for old_date in inspect(obj).attrs.date.history.deleted:
+                keys.add((obj.sunflower_id, old_date))
+    
+    for obj in session.deleted:
+        if isinstance(obj, JournalEntry):
+            keys.add((obj.sunflower_id, obj.date))
+        elif isinstance(obj, Sunflower):
+            connection.execute(delete(JournalBucket)
+                               .where(JournalBucket.sunflower_id == obj.id))
+    
+    refresh_buckets(connection, keys)
@@ -0,0 +1,122 @@
+"""Near-duplicate photo lookup over perceptual hashes.
+
+Hashes are stored as PHOTO_HASH_CHUNKS indexed chunks. Two hashes at most
+`d` bits apart must agree to within d // PHOTO_HASH_CHUNKS bits on at least
+one chunk (pigeonhole), so candidates are the rows where some chunk equals
+one of the few values that close to the query's chunk: a handful of index
+lookups however large the library is. Candidates are then checked against
+the full distance.
+"""
+from itertools import combinations
+
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.orm import load_only
+
+from app import db
+from app.models import (PHOTO_HASH_CHUNK_BITS, PHOTO_HASH_CHUNKS, ArchivedEntry, BannedImage,
+                        JournalEntry, split_photo_hash)
+
+
+def hamming(a, b):
+    """Number of bits that differ between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+def _chunk_variants(chunk, flips):
+    """Every chunk value at most `flips` bits from `chunk`."""
+    values = [chunk]
+    for count in range(1, flips + 1):
+        for bits in combinations(range(PHOTO_HASH_CHUNK_BITS), count):
+            variant = chunk
+            for bit in bits:
+                variant ^= 1 << bit
+            values.append(variant)
+    return values
+
+
+def near_condition(model, value, max_distance):
+    """
+    SQL condition selecting candidate rows of `model` within `max_distance` of `value`.
+    
+    Every true match is selected; some rows further away may be too.
+    """
+    flips = max_distance // PHOTO_HASH_CHUNKS
+    return or_(*[column.in_(_chunk_variants(chunk, flips))
+                 for column, chunk in zip(model.photo_hash_columns(), split_photo_hash(value))])
+
+
+def near_matches(query, model, value, max_distance=None):
+    """
+    Rows from `query` whose photo hash is within `max_distance` bits of `value`.
+    
+    Args:
+        query: Query over `model` (add filters or eager loads as needed)
+        model: Model using PhotoHashMixin
+        value: 64-bit hash to match
+        max_distance: Largest distance in bits (defaults to PHOTO_HASH_MAX_DISTANCE)
+    
+    Returns:
+        list: Matching rows, closest first
+    """
+    if max_distance is None:
+        max_distance = current_app.config['PHOTO_HASH_MAX_DISTANCE']
+    candidates = query.filter(near_condition(model, value, max_distance))
+    matches = [(hamming(row.photo_hash, value), row) for row in candidates]
+    return [row for distance, row in sorted(matches, key=lambda match: match[0])
+            if distance <= max_distance]
+
+
+def is_banned(value):
+    """Whether a photo hash is a near match of any banned image."""
+    return bool(near_matches(BannedImage.query, BannedImage, value))
+
+
+def similar_entries(value):
+    """Live and archived entries whose photo is a near match of `value`, closest first."""
+    return (near_matches(JournalEntry.query, JournalEntry, value),
+            near_matches(ArchivedEntry.query, ArchivedEntry, value))
+
+
+def closest_entry(value):
+    """
+    Id of the live or archived entry whose photo is closest to `value`.
+    
+    Loads only ids and hash chunks, so checking an upload against the
+    whole library costs the same few index lookups as a ban check.
+    
+    Returns:
+        int: Entry id, or None if no photo is within PHOTO_HASH_MAX_DISTANCE
+    """
+    matches = []
+    for model in (JournalEntry, ArchivedEntry):
+        query = db.session.query(model).options(load_only(model.id, *model.photo_hash_columns()))
+        closest = near_matches(query, model, value)[:1]
+        matches += [(hamming(row.photo_hash, value), row.id) for row in closest]
+    return min(matches)[1] if matches else None
+
+
+def ban_near_matches(value, banned_by=None):
+    """
+    Ban an image and take down every photo that is a near match of it.
+    
+    Matching entries (live and archived) keep their notes but lose their
+    photo. The caller commits, then deletes the returned files.
+    
+    Args:
+        value: 64-bit hash of the image to ban
+        banned_by: Moderator banning it
+    
+    Returns:
+        list: Photo filenames no longer referenced by any entry
+    """
+    ban = BannedImage(banned_by_id=banned_by.id if banned_by else None)
+    ban.photo_hash = value
+    db.session.add(ban)
+    
+    live, archived = similar_entries(value)
+    removed = []
+    for entry in (*live, *archived):
+        removed.append(entry.photo_path)
+        entry.set_photo(None)
+    return removed
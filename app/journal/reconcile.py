@@ -0,0 +1,111 @@
+"""Reconcile the upload folder with photo paths stored in the database."""
+import heapq
+import os
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.journal.archive import photo_rows
+from app.models import ArchivedEntry, JobCheckpoint, JournalEntry
+
+FILES_CHECKPOINT = 'reconcile-uploads:files'
+ROWS_CHECKPOINT = 'reconcile-uploads:rows'
+
+
+def _upload_names(folder, after):
+    """Stream names of uploaded files sorting after `after`, without listing the folder."""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name > after and not entry.name.startswith('.') and entry.is_file():
+                yield entry.name
+
+
+def _referenced(names):
+    """Subset of `names` that some journal entry, current or archived, still points at."""
+    return set(db.session.scalars(
+        select(JournalEntry.photo_path).where(JournalEntry.photo_path.in_(names))
+        .union(select(ArchivedEntry.photo_path).where(ArchivedEntry.photo_path.in_(names)))))
+
+
+def quarantine_orphans(limit, batch_size, dry_run=False):
+    """
+    Move files no entry refers to into the quarantine folder.
+    
+    Each run examines the next `limit` files in name order after the
+    stored checkpoint, so memory stays bounded by `limit` however large
+    the folder is, and repeated runs sweep it incrementally. Files newer
+    than UPLOAD_ORPHAN_GRACE seconds are skipped because their entry may
+    not be committed yet.
+    
+    Returns:
+        dict: Counts of files examined and quarantined
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    quarantine = current_app.config['UPLOAD_QUARANTINE_FOLDER']
+    cutoff = time.time() - current_app.config['UPLOAD_ORPHAN_GRACE']
+    checkpoint = JobCheckpoint.load(FILES_CHECKPOINT)
+    
+    names = heapq.nsmallest(limit, _upload_names(folder, checkpoint.value))
+    orphans = []
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        known = _referenced(batch)
+        for name in batch:
+            if name in known:
+                continue
+            path = folder / name
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                if not dry_run:
+                    os.makedirs(quarantine, exist_ok=True)
+                    os.replace(path, quarantine / name)
+            except FileNotFoundError:
+                continue
+            orphans.append(name)
+            current_app.logger.info(f"Quarantined orphaned upload {name}")
+    
+    if not dry_run:
+        # A short batch means the sweep reached the end; start over next time
+        checkpoint.value = names[-1] if len(names) == limit else ''
+        db.session.commit()
+    
+    return {'examined': len(names), 'quarantined': len(orphans)}
+
+
+def find_missing(limit, batch_size, dry_run=False):
+    """
+    Report entries, live or archived, whose photo file no longer exists.
+    
+    Walks entries with photos in id order from the stored checkpoint,
+    `batch_size` rows per query.
+    
+    Returns:
+        dict: Count of rows examined and (entry id, photo path) pairs of missing files
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    checkpoint = JobCheckpoint.load(ROWS_CHECKPOINT)
+    last_id = int(checkpoint.value or 0)
+    examined = 0
+    missing = []
+    
+    while examined < limit:
+        rows = photo_rows(last_id, min(batch_size, limit - examined))
+        if not rows:
+            last_id = 0
+            break
+        
+        for entry_id, photo_path in rows:
+            if not (folder / photo_path).exists():
+                missing.append((entry_id, photo_path))
+                current_app.logger.warning(f"Entry {entry_id} points at missing upload {photo_path}")
+        examined += len(rows)
+        last_id = rows[-1].id
+    
+    if not dry_run:
+        checkpoint.value = str(last_id)
+        db.session.commit()
+    
+    return {'examined': examined, 'missing': missing}
@@ -0,0 +1,185 @@
+"""Re-run the upload pipeline over photos already in the library."""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
+
+from flask import current_app
+from PIL import Image
+
+from app import db
+from app.journal.archive import photo_rows
+from app.journal.utils import (PhotoInfo, delete_photo, make_placeholder, photo_hash,
+                               photo_info, process_image, write_image)
+from app.models import ArchivedEntry, JobCheckpoint, JournalEntry
+
+CHECKPOINT = 'reprocess-photos'
+
+
+def reprocess_file(task):
+    """
+    Reprocess one stored photo (runs in a worker process).
+    
+    Args:
+        task: (entry_id, upload_folder, filename, max_dim, quality, photo_format)
+    
+    Returns:
+        tuple: (entry_id, old filename, PhotoInfo for the new file or None,
+        bytes before, bytes after, error message or None). The PhotoInfo is
+        None when the file was left as it was.
+    """
+    entry_id, folder, filename, max_dim, quality, photo_format = task
+    path = folder / filename
+    try:
+        before = path.stat().st_size
+        ext = photo_format or filename.rsplit('.', 1)[1].lower()
+        new_filename = f"{uuid4().hex}.{ext}"
+        
+        with Image.open(path) as image:
+            processed = process_image(image, max_dim)
+        write_image(processed, folder / new_filename, quality)
+        after = (folder / new_filename).stat().st_size
+        
+        # Same format and no smaller: keep the original
+        if not photo_format and after >= before:
+            os.remove(folder / new_filename)
+            return entry_id, filename, None, before, before, None
+        info = PhotoInfo(new_filename, *processed.size, make_placeholder(processed),
+                         photo_hash(processed))
+        return entry_id, filename, info, before, after, None
+    except Exception as e:
+        return entry_id, filename, None, 0, 0, str(e)
+
+
+def reprocess_library(workers=None, batch_size=200, max_per_second=None, limit=None):
+    """
+    Reprocess every stored photo, live or archived, with the current image settings.
+    
+    Photos are handed to a process pool one batch of entries at a time.
+    Each batch's photo_path updates and the progress checkpoint are
+    committed together, then the replaced files are deleted, so an
+    interrupted run resumes after the last committed batch.
+    
+    Args:
+        workers: Process pool size (defaults to the number of cores)
+        batch_size: Entries per batch and per commit
+        max_per_second: Optional cap on photos processed per second
+        limit: Optional cap on photos processed in this run
+    
+    Returns:
+        dict: processed, replaced, failed, bytes_before, bytes_after, seconds
+    """
+    config = current_app.config
+    folder = config['UPLOAD_FOLDER']
+    checkpoint = JobCheckpoint.load(CHECKPOINT)
+    last_id = int(checkpoint.value or 0)
+    stats = dict(processed=0, replaced=0, failed=0, bytes_before=0, bytes_after=0)
+    started = time.perf_counter()
+    
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while limit is None or stats['processed'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - stats['processed'])
+            rows = photo_rows(last_id, size)
+            if not rows:
+                last_id = 0
+                break
+            
+            batch_started = time.perf_counter()
+            tasks = [(entry_id, folder, photo_path, config['MAX_IMAGE_DIMENSION'],
+                      config['PHOTO_QUALITY'], config['PHOTO_FORMAT'])
+                     for entry_id, photo_path in rows]
+            results = list(pool.map(reprocess_file, tasks, chunksize=4))
+            
+            replaced_files = _apply_batch(results, stats)
+            last_id = rows[-1].id
+            checkpoint.value = str(last_id)
+            db.session.commit()
+            
+            for filename in replaced_files:
+                delete_photo(filename)
+            
+            if max_per_second:
+                pause = len(rows) / max_per_second - (time.perf_counter() - batch_started)
+                if pause > 0:
+                    time.sleep(pause)
+    
+    checkpoint.value = str(last_id)
+    db.session.commit()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def backfill_photo_info(batch_size=500):
+    """
+    Fill in dimensions, placeholders and hashes for photos stored before they were recorded.
+    
+    Live and archived entries are walked in id order and committed one batch at a time, so
+    the command can be interrupted and rerun; entries whose file is
+    missing are skipped.
+    
+    Args:
+        batch_size: Entries per batch and per commit
+    
+    Returns:
+        dict: updated, missing
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    stats = dict(updated=0, missing=0)
+    
+    for model in (JournalEntry, ArchivedEntry):
+        last_id = 0
+        while True:
+            entries = model.query \
+                .filter(model.id > last_id, model.photo_path.is_not(None),
+                        db.or_(model.photo_placeholder.is_(None), model.photo_hash_0.is_(None))) \
+                .order_by(model.id) \
+                .limit(batch_size) \
+                .all()
+            if not entries:
+                break
+            
+            for entry in entries:
+                try:
+                    entry.set_photo(photo_info(folder / entry.photo_path)
+                                    ._replace(duplicate_of=entry.photo_duplicate_of))
+                    stats['updated'] += 1
+                except OSError as e:
+                    stats['missing'] += 1
+                    current_app.logger.warning(f"Skipping entry {entry.id} ({entry.photo_path}): {e}")
+            
+            last_id = entries[-1].id
+            db.session.commit()
+    
+    return stats
+
+
+def _apply_batch(results, stats):
+    """Point entries at their reprocessed files; returns the files they replaced."""
+    changed_ids = [entry_id for entry_id, _, new, *_ in results if new]
+    entries = {entry.id: entry for model in (JournalEntry, ArchivedEntry)
+               for entry in model.query.filter(model.id.in_(changed_ids))}
+    replaced = []
+    
+    for entry_id, old, new, before, after, error in results:
+        stats['processed'] += 1
+        if error:
+            stats['failed'] += 1
+            current_app.logger.error(f"Error reprocessing {old} (entry {entry_id}): {error}")
+            continue
+        
+        entry = entries.get(entry_id)
+        if new and (entry is None or entry.photo_path != old):
+            # The entry changed while we worked; discard our copy
+            delete_photo(new.filename)
+            new = None
+        
+        stats['bytes_before'] += before
+        if new:
+            entry.set_photo(new._replace(duplicate_of=entry.photo_duplicate_of))
+            replaced.append(old)
+            stats['replaced'] += 1
+            stats['bytes_after'] += after
+        else:
+            stats['bytes_after'] += before
+    
+    return replaced
@@ -1,28 +1,193 @@
 """Journal routes."""
-from flask import render_template, redirect, url_for, flash, request, abort
+from datetime import date
+
+from flask import render_template, redirect, url_for, flash, request, abort, current_app
 from flask_login import login_required, current_user
+from sqlalchemy import func
 
 from app import db
 from app.journal import bp
 from app.journal.forms import JournalEntryForm, SunflowerSettingsForm
 from app.journal.utils import save_photo, delete_photo
-from app.models import JournalEntry
+from app.journal.buckets import PERIODS, bucket_end
+from app.journal.timelapse import request_timelapse
+from app.models import ArchivedEntry, JournalEntry, JournalBucket
+from app.pagination import paginate_keyset
+from app.read_models import entry_card_query, to_cards
+
+# Newest first; id breaks ties between entries on the same day
+JOURNAL_ORDER = (JournalEntry.date, JournalEntry.created_at, JournalEntry.id)
+
+
+# Archive pages read past seasons in the same order
+ARCHIVE_ORDER = (ArchivedEntry.date, ArchivedEntry.created_at, ArchivedEntry.id)
+
+
+def _period_arg():
+    """Grouping requested by the reader ('week' or 'month')."""
+    period = request.args.get('group', 'month')
+    return period if period in PERIODS else 'month'
+
+
+def _bucket_page(sunflower, period, cursor):
+    """Load one batch of a sunflower's period summaries starting after `cursor`."""
+    query = JournalBucket.query.filter_by(sunflower_id=sunflower.id, period=period)
+    return paginate_keyset(query, (JournalBucket.start,), cursor,
+                           current_app.config['JOURNAL_PERIODS_PER_PAGE'])
 
 
 @bp.route('/my-journal')
 @login_required
 def my_journal():
-    """View user's journal timeline."""
+    """View user's journal timeline, grouped by week or month."""
     sunflower = current_user.sunflower
     
     if not sunflower:
         flash('Error loading your journal. Please contact support.', 'error')
         return redirect(url_for('index'))
     
-    # Get all entries, ordered by date descending
-    entries = sunflower.entries.all()
+    period = _period_arg()
+    buckets, next_cursor = _bucket_page(sunflower, period, request.args.get('cursor'))
+    
+    has_archive = db.session.query(
+        sunflower.archived_entries.with_entities(ArchivedEntry.id).exists()).scalar()
+    
+    return render_template('journal/my_journal.html', sunflower=sunflower, period=period,
+                         buckets=buckets, next_cursor=next_cursor, has_archive=has_archive)
+
+
+@bp.route('/my-journal/periods')
+@login_required
+def journal_periods():
+    """Next batch of period summaries for infinite scroll (HTMX fragment, no layout)."""
+    sunflower = current_user.sunflower
+    
+    if not sunflower:
+        abort(404)
+    
+    period = _period_arg()
+    buckets, next_cursor = _bucket_page(sunflower, period, request.args.get('cursor'))
+    
+    return render_template('journal/_buckets.html', period=period,
+                         buckets=buckets, next_cursor=next_cursor)
+
+
+@bp.route('/my-journal/<any(week, month):period>/<start>')
+@login_required
+def bucket_entries(period, start):
+    """Entries of one week or month, loaded when the period scrolls into view."""
+    sunflower = current_user.sunflower
+    
+    if not sunflower:
+        abort(404)
+    
+    try:
+        start = date.fromisoformat(start)
+    except ValueError:
+        abort(404)
+    
+    entries = to_cards(entry_card_query()
+                       .filter(JournalEntry.sunflower_id == sunflower.id,
+                               JournalEntry.date >= start,
+                               JournalEntry.date < bucket_end(start, period))
+                       .order_by(*[column.desc() for column in JOURNAL_ORDER]))
+    
+    return render_template('journal/_entries.html', entries=entries)
+
+
+def _timelapse_status(sunflower):
+    """Current timelapse state for a sunflower, starting a build if needed."""
+    config = current_app.config
+    return request_timelapse(config['UPLOAD_FOLDER'], config['TIMELAPSE_FOLDER'], sunflower.id,
+                             config['TIMELAPSE_SIZE'], config['TIMELAPSE_FRAME_MS'],
+                             config['TIMELAPSE_LOCK_TIMEOUT'])
+
+
+@bp.route('/my-journal/timelapse')
+@login_required
+def timelapse():
+    """Animated timelapse of the user's journal photos."""
+    sunflower = current_user.sunflower
+    
+    if not sunflower:
+        abort(404)
+    
+    status, filename = _timelapse_status(sunflower)
+    
+    return render_template('journal/timelapse.html', sunflower=sunflower,
+                         status=status, filename=filename)
+
+
+@bp.route('/my-journal/timelapse/status')
+@login_required
+def timelapse_status():
+    """Timelapse build progress, polled by HTMX until it is ready (fragment, no layout)."""
+    sunflower = current_user.sunflower
+    
+    if not sunflower:
+        abort(404)
+    
+    status, filename = _timelapse_status(sunflower)
+    
+    return render_template('journal/_timelapse.html', sunflower=sunflower,
+                         status=status, filename=filename)
+
+
+def _archive_page(sunflower, season, cursor):
+    """Load one batch of a past season's entries starting after `cursor`."""
+    if not date.min.year <= season < date.max.year:
+        abort(404)
+    
+    query = entry_card_query(ArchivedEntry) \
+        .filter(ArchivedEntry.sunflower_id == sunflower.id,
+                ArchivedEntry.date >= date(season, 1, 1),
+                ArchivedEntry.date < date(season + 1, 1, 1))
+    rows, next_cursor = paginate_keyset(query, ARCHIVE_ORDER, cursor,
+                                        current_app.config['ENTRIES_PER_PAGE'])
+    return to_cards(rows), next_cursor
+
+
+@bp.route('/my-journal/archive')
+@bp.route('/my-journal/archive/<int:season>')
+@login_required
+def archive(season=None):
+    """Read-only view of past seasons moved out of the journal."""
+    sunflower = current_user.sunflower
+    
+    if not sunflower:
+        abort(404)
+    
+    year = func.extract('year', ArchivedEntry.date)
+    seasons = db.session.query(year, func.count()) \
+        .filter(ArchivedEntry.sunflower_id == sunflower.id) \
+        .group_by(year) \
+        .order_by(year.desc()) \
+        .all()
+    seasons = [(int(year), count) for year, count in seasons]
     
-    return render_template('journal/my_journal.html', sunflower=sunflower, entries=entries)
+    if season is None and seasons:
+        season = seasons[0][0]
+    entries, next_cursor = [], None
+    if season is not None:
+        entries, next_cursor = _archive_page(sunflower, season, request.args.get('cursor'))
+    
+    return render_template('journal/archive.html', sunflower=sunflower, seasons=seasons,
+                         season=season, entries=entries, next_cursor=next_cursor)
+
+
+@bp.route('/my-journal/archive/<int:season>/entries')
+@login_required
+def archive_entries(season):
+    """Next batch of a past season's entries (HTMX fragment, no layout)."""
+    sunflower = current_user.sunflower
+    
+    if not sunflower:
+        abort(404)
+    
+    entries, next_cursor = _archive_page(sunflower, season, request.args.get('cursor'))
+    
+    return render_template('journal/_archive_entries.html', season=season,
+                         entries=entries, next_cursor=next_cursor)
 
 
 @bp.route('/entry/new', methods=['GET', 'POST'])
@@ -38,10 +203,10 @@ def new_entry():
     
     if form.validate_on_submit():
         # Handle photo upload
-        photo_filename = None
+        photo = None
         if form.photo.data:
-            photo_filename = save_photo(form.photo.data)
-            if not photo_filename:
+            photo = save_photo(form.photo.data)
+            if not photo:
                 flash('Error uploading photo. Please try again.', 'error')
                 return render_template('journal/entry_form.html', form=form, title='New Entry')
         
@@ -51,12 +216,18 @@ def new_entry():
             date=form.date.data,
             note=form.note.data,
             height_cm=form.height_cm.data,
-            photo_path=photo_filename,
             is_public=True  # Default public for MVP
         )
+        entry.set_photo(photo)
         
         db.session.add(entry)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except Exception:
+            # Don't leave the saved file behind without a row
+            db.session.rollback()
+            delete_photo(entry.photo_path)
+            raise
         
         flash('Entry added to your journal!', 'success')
         return redirect(url_for('journal.my_journal'))
@@ -91,14 +262,12 @@ def edit_entry(entry_id):
     
     if form.validate_on_submit():
         # Handle photo upload
+        old_photo = None
         if form.photo.data:
-            # Delete old photo if exists
-            if entry.photo_path:
-                delete_photo(entry.photo_path)
-            
-            photo_filename = save_photo(form.photo.data)
-            if photo_filename:
-                entry.photo_path = photo_filename
+            photo = save_photo(form.photo.data)
+            if photo:
+                old_photo = entry.photo_path
+                entry.set_photo(photo)
             else:
                 flash('Error uploading photo. Entry saved without new photo.', 'warning')
         
@@ -109,6 +278,10 @@ def edit_entry(entry_id):
         
         db.session.commit()
         
+        # Only drop the old photo once nothing refers to it
+        if old_photo:
+            delete_photo(old_photo)
+        
         flash('Entry updated!', 'success')
         return redirect(url_for('journal.my_journal'))
     
@@ -125,13 +298,14 @@ def delete_entry(entry_id):
     if entry.sunflower.user_id != current_user.id:
         abort(403)
     
-    # Delete photo if exists
-    if entry.photo_path:
-        delete_photo(entry.photo_path)
-    
+    photo_path = entry.photo_path
     db.session.delete(entry)
     db.session.commit()
     
+    # Delete photo once the row is gone
+    if photo_path:
+        delete_photo(photo_path)
+    
     flash('Entry deleted.', 'info')
     return redirect(url_for('journal.my_journal'))
 
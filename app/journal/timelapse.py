@@ -0,0 +1,257 @@
+"""Animated timelapses of a sunflower's journal photos."""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont, features
+from sqlalchemy import select
+
+from app import db
+from app.models import JournalEntry
+
+# One build at a time per worker process; requests never wait on it.
+# Workers share builds through a lock file next to the output
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='timelapse')
+_jobs = {}
+_failed = set()
+_jobs_lock = threading.Lock()
+
+
+def output_format():
+    """Animated WebP when Pillow supports it, GIF otherwise."""
+    return 'webp' if features.check('webp_anim') else 'gif'
+
+
+def timelapse_frames(sunflower_id):
+    """
+    List the photos that make up a sunflower's timelapse.
+    
+    Returns:
+        tuple: (frames, revision) where frames are (photo_path, caption)
+        pairs in journal order and revision changes whenever any of them does
+    """
+    rows = db.session.execute(
+        select(JournalEntry.id, JournalEntry.date, JournalEntry.height_cm,
+               JournalEntry.photo_path, JournalEntry.updated_at)
+        .where(JournalEntry.sunflower_id == sunflower_id, JournalEntry.photo_path.is_not(None))
+        .order_by(JournalEntry.date, JournalEntry.created_at, JournalEntry.id)
+    ).all()
+    
+    digest = hashlib.sha1()
+    frames = []
+    for row in rows:
+        digest.update(f'{row.id}:{row.photo_path}:{row.height_cm}:{row.date}:{row.updated_at};'.encode())
+        caption = row.date.strftime('%b %d, %Y')
+        if row.height_cm is not None:
+            caption += f' · {row.height_cm:g} cm'
+        frames.append((row.photo_path, caption))
+    return frames, digest.hexdigest()[:16]
+
+
+def cached_filename(sunflower_id, revision):
+    """Cache file name for one revision of a sunflower's timelapse."""
+    return f'timelapse-{sunflower_id}-{revision}.{output_format()}'
+
+
+def _render_frame(upload_folder, photo_path, caption, size):
+    """Render one captioned, letterboxed frame from a journal photo."""
+    frame = Image.new('RGB', (size, size), (27, 27, 27))
+    try:
+        with Image.open(upload_folder / photo_path) as photo:
+            # Decode JPEGs straight at (roughly) the target size
+            photo.draft('RGB', (size, size))
+            photo = photo.convert('RGB')
+            photo.thumbnail((size, size), Image.Resampling.LANCZOS)
+        frame.paste(photo, ((size - photo.width) // 2, (size - photo.height) // 2))
+    except OSError:
+        pass
+    
+    draw = ImageDraw.Draw(frame)
+    draw.rectangle((0, size - 24, size, size), fill=(0, 0, 0))
+    draw.text((8, size - 18), caption, fill=(244, 168, 53), font=ImageFont.load_default())
+    return frame
+
+
+class _LazyFrame:
+    """
+    Timelapse frame rendered only when the encoder reaches it.
+    
+    Pillow collects ``append_images`` into a list before encoding, so
+    passing finished frames would keep every decoded frame alive at once.
+    The animated WebP encoder loads and serializes frames one by one;
+    this renders on load() and lets go after tobytes(), so a single
+    decoded frame is in memory at a time.
+    """
+    
+    n_frames = 1
+    mode = 'RGB'
+    
+    def __init__(self, render, size):
+        self._render = render
+        self._image = None
+        self.size = (size, size)
+    
+    def _get(self):
+        if self._image is None:
+            self._image = self._render()
+        return self._image
+    
+    def seek(self, frame):
+        if frame != 0:
+            raise EOFError
+    
+    def tell(self):
+        return 0
+    
+    def load(self):
+        return self._get().load()
+    
+    def tobytes(self, *args, **kwargs):
+        data = self._get().tobytes(*args, **kwargs)
+        self._image = None
+        return data
+    
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+def build_timelapse(upload_folder, frames, output_path, size, frame_ms):
+    """
+    Write an animated timelapse, rendering frames as the encoder needs them.
+    
+    Args:
+        upload_folder: Folder holding the photos
+        frames: (photo_path, caption) pairs in order
+        output_path: Destination; written atomically
+        size: Width and height of each frame in pixels
+        frame_ms: Display time per frame in milliseconds
+    
+    Returns:
+        bool: False if none of the photos exist
+    """
+    frames = [(path, caption) for path, caption in frames if (upload_folder / path).exists()]
+    if not frames:
+        return False
+    
+    first = _render_frame(upload_folder, *frames[0], size)
+    rest = [_LazyFrame(partial(_render_frame, upload_folder, path, caption, size), size)
+            for path, caption in frames[1:]]
+    
+    os.makedirs(output_path.parent, exist_ok=True)
+    # A temp file of its own, so no other build can write into what we publish
+    partial_file = tempfile.NamedTemporaryFile(dir=output_path.parent, prefix=output_path.name + '.',
+                                               suffix='.part', delete=False)
+    try:
+        with partial_file:
+            first.save(partial_file, format=output_path.suffix[1:].upper(), save_all=True,
+                       append_images=rest, duration=frame_ms, loop=0)
+        os.replace(partial_file.name, output_path)
+    except BaseException:
+        Path(partial_file.name).unlink(missing_ok=True)
+        raise
+    
+    # Older revisions of this timelapse are now stale
+    prefix = output_path.name.rsplit('-', 1)[0] + '-'
+    for stale in output_path.parent.glob(f'{prefix}*'):
+        if stale != output_path and not stale.name.endswith(('.part', '.lock')):
+            stale.unlink(missing_ok=True)
+    return True
+
+
+def _lock_path(output_path):
+    """Lock file marking a build of `output_path` in progress in some worker."""
+    return output_path.with_name(output_path.name + '.lock')
+
+
+def _claim_build(output_path, lock_timeout):
+    """
+    Take the cross-process lock for building `output_path`.
+    
+    The lock file is created with O_EXCL, so exactly one worker wins.
+    A lock older than `lock_timeout` seconds was left by a worker that
+    died mid-build and is taken over.
+    
+    Returns:
+        bool: True if this process should build
+    """
+    os.makedirs(output_path.parent, exist_ok=True)
+    lock_path = _lock_path(output_path)
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime < lock_timeout:
+                    return False
+            except FileNotFoundError:
+                continue
+            lock_path.unlink(missing_ok=True)
+    return False
+
+
+def request_timelapse(upload_folder, output_folder, sunflower_id, size, frame_ms, lock_timeout):
+    """
+    Return the cached timelapse for a sunflower, or start building it.
+    
+    Each revision is built once across all worker processes: the worker
+    that claims the lock file builds it, the others report 'building'
+    until the file appears.
+    
+    Args:
+        upload_folder: Folder holding the photos
+        output_folder: Folder holding built timelapses
+        sunflower_id: Sunflower whose photos to animate
+        size: Width and height of each frame in pixels
+        frame_ms: Display time per frame in milliseconds
+        lock_timeout: Seconds after which another worker's build is presumed dead
+    
+    Returns:
+        tuple: (status, filename) where status is 'ready', 'building',
+        'failed' or 'empty'
+    """
+    frames, revision = timelapse_frames(sunflower_id)
+    if not frames:
+        return 'empty', None
+    
+    filename = cached_filename(sunflower_id, revision)
+    if (output_folder / filename).exists():
+        return 'ready', filename
+    
+    with _jobs_lock:
+        if filename in _failed:
+            return 'failed', None
+        if filename not in _jobs:
+            output_path = output_folder / filename
+            if not _claim_build(output_path, lock_timeout):
+                return 'building', filename
+            if output_path.exists():
+                # Another worker published it between our check and the claim
+                _lock_path(output_path).unlink(missing_ok=True)
+                return 'ready', filename
+            job = _executor.submit(_build_claimed, upload_folder, frames,
+                                   output_path, size, frame_ms)
+            _jobs[filename] = job
+            job.add_done_callback(partial(_finished, filename))
+    return 'building', filename
+
+
+def _build_claimed(upload_folder, frames, output_path, size, frame_ms):
+    """Build a timelapse this process holds the lock for, releasing the lock when done."""
+    try:
+        return build_timelapse(upload_folder, frames, output_path, size, frame_ms)
+    finally:
+        _lock_path(output_path).unlink(missing_ok=True)
+
+
+def _finished(filename, job):
+    """Forget a finished build, remembering failures so they aren't retried forever."""
+    with _jobs_lock:
+        _jobs.pop(filename, None)
+        if job.exception() is not None or not job.result():
+            _failed.add(filename)
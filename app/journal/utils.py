@@ -1,12 +1,32 @@
 """Utilities for journal functionality."""
+import base64
+import io
 import os
+from typing import NamedTuple, Optional
 from uuid import uuid4
 from pathlib import Path
-from PIL import Image
+from PIL import Image, features
 from werkzeug.utils import secure_filename
 from flask import current_app
 
 
+# Longest side of the inline preview shown while a photo loads
+PLACEHOLDER_SIZE = 16
+
+# dHash compares each pixel of a (HASH_SIZE + 1) x HASH_SIZE thumbnail with its right neighbor
+HASH_SIZE = 8
+
+
+class PhotoInfo(NamedTuple):
+    """A stored photo plus what a page needs to lay it out before it loads."""
+    filename: str
+    width: int
+    height: int
+    placeholder: str
+    phash: Optional[int] = None  # perceptual hash, see photo_hash()
+    duplicate_of: Optional[int] = None  # closest existing entry with a near-identical photo
+
+
 def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and \
@@ -21,39 +41,140 @@ def save_photo(photo_file):
         photo_file: FileStorage object from request.files
     
     Returns:
-        str: Filename of saved photo, or None if save failed
+        PhotoInfo: Saved filename, dimensions, placeholder, hash and the entry
+        it nearly duplicates (if any), or None if save failed or the image is
+        a near match of a banned one
     """
     if not photo_file or not allowed_file(photo_file.filename):
         return None
     
     # Generate unique filename
-    ext = secure_filename(photo_file.filename).rsplit('.', 1)[1].lower()
+    ext = current_app.config['PHOTO_FORMAT'] or \
+        secure_filename(photo_file.filename).rsplit('.', 1)[1].lower()
     filename = f"{uuid4().hex}.{ext}"
     filepath = current_app.config['UPLOAD_FOLDER'] / filename
     
     try:
         # Open and process image
         image = Image.open(photo_file)
+        processed = process_image(image, current_app.config['MAX_IMAGE_DIMENSION'])
+        phash = photo_hash(processed)
         
-        # Remove EXIF data for privacy
-        image_data = list(image.getdata())
-        image_without_exif = Image.new(image.mode, image.size)
-        image_without_exif.putdata(image_data)
-        
-        # Resize if too large
-        max_dim = current_app.config['MAX_IMAGE_DIMENSION']
-        if max(image_without_exif.size) > max_dim:
-            image_without_exif.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+        from app.journal.phash import closest_entry, is_banned
+        if is_banned(phash):
+            current_app.logger.info(f"Rejected upload matching banned image {phash:016x}")
+            return None
+        # Near-duplicates of the library are kept but flagged for moderators
+        duplicate_of = closest_entry(phash)
         
-        # Save
-        image_without_exif.save(filepath, optimize=True, quality=85)
+        write_image(processed, filepath, current_app.config['PHOTO_QUALITY'])
         
-        return filename
+        return PhotoInfo(filename, *processed.size, make_placeholder(processed), phash, duplicate_of)
     except Exception as e:
         current_app.logger.error(f"Error saving photo: {e}")
         return None
 
 
+def process_image(image, max_dim):
+    """
+    Strip metadata from an image and shrink it to fit `max_dim`.
+    
+    Args:
+        image: Opened PIL Image
+        max_dim: Largest allowed width or height in pixels
+    
+    Returns:
+        Image: New image without EXIF data
+    """
+    # Let JPEG decode at a reduced scale when the image will be shrunk anyway
+    image.draft(image.mode, (max_dim, max_dim))
+    
+    # Resize if too large
+    if max(image.size) > max_dim:
+        image.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+    
+    # Remove EXIF data for privacy
+    image_without_exif = Image.new(image.mode, image.size)
+    image_without_exif.putdata(image.getdata())
+    return image_without_exif
+
+
+def make_placeholder(image):
+    """
+    Encode a tiny preview of an image to show (stretched) while it loads.
+    
+    Args:
+        image: PIL Image, typically the processed upload
+    
+    Returns:
+        str: data: URI of a PLACEHOLDER_SIZE-pixel WebP (PNG without WebP support)
+    """
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    small = small.convert('RGB')
+    
+    fmt = 'webp' if features.check('webp') else 'png'
+    buffer = io.BytesIO()
+    small.save(buffer, format=fmt, quality=40)
+    return f"data:image/{fmt};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def photo_hash(image):
+    """
+    Compute the difference hash (dHash) of an image.
+    
+    Near-identical images (rescaled, recompressed, slightly recolored)
+    get hashes only a few bits apart.
+    
+    Args:
+        image: PIL Image
+    
+    Returns:
+        int: 64-bit hash
+    """
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            value = (value << 1) | (left > pixels[row * (HASH_SIZE + 1) + col + 1])
+    return value
+
+
+def photo_info(filepath):
+    """
+    Read the dimensions, placeholder and hash of a stored photo.
+    
+    Args:
+        filepath: Path to a photo in the upload folder
+    
+    Returns:
+        PhotoInfo: Filename, dimensions, placeholder and hash
+    """
+    with Image.open(filepath) as image:
+        width, height = image.size
+        # JPEGs can decode straight at a fraction of their size
+        image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        placeholder = make_placeholder(image)
+        phash = photo_hash(image)
+    return PhotoInfo(Path(filepath).name, width, height, placeholder, phash)
+
+
+def write_image(image, filepath, quality):
+    """
+    Write a processed image, picking the format from the file extension.
+    
+    Args:
+        image: PIL Image to write
+        filepath: Destination path
+        quality: Encoder quality for lossy formats
+    """
+    if filepath.suffix.lower() in ('.jpg', '.jpeg') and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(filepath, optimize=True, quality=quality)
+
+
 def delete_photo(filename):
     """
     Delete photo file.
@@ -0,0 +1,158 @@
+"""Outbound email queue."""
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import OutboundEmail
+
+
+def enqueue_email(recipient, subject, body):
+    """
+    Queue an email for the background sender.
+    
+    The message is added to the current session, so it is only sent if
+    the caller's transaction commits. Requests never wait on SMTP.
+    
+    Args:
+        recipient: Destination address
+        subject: Subject line
+        body: Plain-text body
+    
+    Returns:
+        OutboundEmail: The queued message
+    """
+    message = OutboundEmail(recipient=recipient, subject=subject, body=body)
+    db.session.add(message)
+    return message
+
+
+class MailSender:
+    """
+    Drain the outbound queue over one reused SMTP connection.
+    
+    Messages are claimed in batches; failed deliveries are retried with
+    exponential backoff until MAIL_MAX_ATTEMPTS is reached. Must be used
+    inside an app context.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.connection = None
+        self.last_used = 0.0
+    
+    def connect(self):
+        """Open the SMTP connection, or return the one already open."""
+        if self.connection is not None:
+            return self.connection
+        
+        smtp_class = smtplib.SMTP_SSL if self.config['MAIL_USE_SSL'] else smtplib.SMTP
+        connection = smtp_class(self.config['MAIL_SERVER'], self.config['MAIL_PORT'], timeout=30)
+        if self.config['MAIL_USE_TLS']:
+            connection.starttls()
+        if self.config['MAIL_USERNAME']:
+            connection.login(self.config['MAIL_USERNAME'], self.config['MAIL_PASSWORD'])
+        self.connection = connection
+        return connection
+    
+    def close(self):
+        """Close the SMTP connection if one is open."""
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+    
+    def send_batch(self):
+        """
+        Deliver one batch of due messages.
+        
+        Returns:
+            int: Number of messages claimed
+        """
+        now = datetime.utcnow()
+        batch = db.session.scalars(
+            select(OutboundEmail)
+            .where(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now)
+            .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id)
+            .limit(self.config['MAIL_BATCH_SIZE'])
+            .with_for_update(skip_locked=True)
+        ).all()
+        
+        for message in batch:
+            try:
+                self._deliver(self._build(message))
+            except (smtplib.SMTPException, OSError) as e:
+                self._schedule_retry(message, e)
+                if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self.close()
+            except Exception as e:
+                # Not a delivery problem (e.g. a header that can't be encoded):
+                # retrying won't help, and the rest of the batch must still go out
+                self._give_up(message, e)
+            else:
+                message.status = 'sent'
+                message.sent_at = datetime.utcnow()
+                message.attempts += 1
+        
+        db.session.commit()
+        if batch:
+            self.last_used = time.monotonic()
+        return len(batch)
+    
+    def run(self):
+        """Send forever, keeping the connection open between busy polls."""
+        try:
+            while True:
+                try:
+                    if self.send_batch():
+                        continue
+                except Exception as e:
+                    # A database hiccup; the claimed messages are still pending
+                    db.session.rollback()
+                    self.close()
+                    current_app.logger.error(f"Error sending mail batch: {e}")
+                if self.connection and time.monotonic() - self.last_used > self.config['MAIL_IDLE_TIMEOUT']:
+                    self.close()
+                time.sleep(self.config['MAIL_POLL_INTERVAL'])
+        finally:
+            self.close()
+    
+    def _deliver(self, email):
+        """Send over the open connection, reconnecting once if the server hung up."""
+        try:
+            self.connect().send_message(email)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self.connect().send_message(email)
+    
+    def _build(self, message):
+        """Turn a queued row into an EmailMessage."""
+        email = EmailMessage()
+        email['From'] = self.config['MAIL_DEFAULT_SENDER']
+        email['To'] = message.recipient
+        email['Subject'] = message.subject
+        email.set_content(message.body)
+        return email
+    
+    def _schedule_retry(self, message, error):
+        """Back off after a failed delivery, or give up."""
+        if message.attempts + 1 >= self.config['MAIL_MAX_ATTEMPTS']:
+            self._give_up(message, error)
+        else:
+            message.attempts += 1
+            message.last_error = str(error)
+            delay = self.config['MAIL_RETRY_DELAY'] * 2 ** (message.attempts - 1)
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    
+    def _give_up(self, message, error):
+        """Mark a message failed for good."""
+        message.attempts += 1
+        message.last_error = str(error)
+        message.status = 'failed'
+        current_app.logger.error(f"Giving up on email {message.id}: {error}")
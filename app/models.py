@@ -1,12 +1,70 @@
 """Database models."""
+import hashlib
+import hmac
 from datetime import datetime
+from flask import current_app
 from flask_login import UserMixin
 from argon2 import PasswordHasher
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from app import db
 
 ph = PasswordHasher()
 
 
+# Community membership; a user can belong to any number of communities
+community_members = db.Table(
+    'community_members',
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    db.Column('community_id', db.Integer, db.ForeignKey('communities.id'), primary_key=True, index=True),
+)
+
+
+# Perceptual photo hashes are 64-bit dHashes stored as four 16-bit chunks,
+# each indexed on its own, so near matches are found with exact chunk
+# lookups (multi-index hashing) instead of scanning every hash
+PHOTO_HASH_CHUNKS = 4
+PHOTO_HASH_CHUNK_BITS = 16
+
+
+class PhotoHashMixin:
+    """Indexed perceptual hash columns, see PHOTO_HASH_CHUNKS."""
+    
+    photo_hash_0 = db.Column(db.Integer, nullable=True, index=True)
+    photo_hash_1 = db.Column(db.Integer, nullable=True, index=True)
+    photo_hash_2 = db.Column(db.Integer, nullable=True, index=True)
+    photo_hash_3 = db.Column(db.Integer, nullable=True, index=True)
+    
+    @classmethod
+    def photo_hash_columns(cls):
+        """The chunk columns, most significant first."""
+        return [getattr(cls, f'photo_hash_{i}') for i in range(PHOTO_HASH_CHUNKS)]
+    
+    @property
+    def photo_hash(self):
+        """The full 64-bit hash, or None."""
+        chunks = [getattr(self, f'photo_hash_{i}') for i in range(PHOTO_HASH_CHUNKS)]
+        if None in chunks:
+            return None
+        value = 0
+        for chunk in chunks:
+            value = (value << PHOTO_HASH_CHUNK_BITS) | chunk
+        return value
+    
+    @photo_hash.setter
+    def photo_hash(self, value):
+        for i, chunk in enumerate(split_photo_hash(value)):
+            setattr(self, f'photo_hash_{i}', chunk)
+
+
+def split_photo_hash(value):
+    """Chunks of a 64-bit photo hash, most significant first (Nones for None)."""
+    if value is None:
+        return [None] * PHOTO_HASH_CHUNKS
+    mask = (1 << PHOTO_HASH_CHUNK_BITS) - 1
+    return [(value >> (PHOTO_HASH_CHUNK_BITS * (PHOTO_HASH_CHUNKS - 1 - i))) & mask
+            for i in range(PHOTO_HASH_CHUNKS)]
+
+
 class User(UserMixin, db.Model):
     """User account model."""
     
@@ -17,10 +75,12 @@ class User(UserMixin, db.Model):
     display_name = db.Column(db.String(80), nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     # Relationships
     sunflower = db.relationship('Sunflower', backref='user', uselist=False, cascade='all, delete-orphan')
+    communities = db.relationship('Community', secondary=community_members,
+                                  backref=db.backref('members', lazy='dynamic'))
     
     def set_password(self, password):
         """Hash and set password."""
@@ -38,10 +98,47 @@ class User(UserMixin, db.Model):
         except:
             return False
     
+    def get_reset_password_token(self):
+        """Create a signed, expiring password reset token."""
+        return _reset_serializer().dumps({
+            'user_id': self.id,
+            # Ties the token to the current password so it works only once
+            'pw': self._password_fingerprint(),
+        })
+    
+    def _password_fingerprint(self):
+        """
+        Keyed digest of the password hash for reset tokens.
+        
+        Token payloads are signed, not encrypted, so they must not carry
+        any of the hash itself; this changes whenever the password does.
+        """
+        key = current_app.config['SECRET_KEY'].encode()
+        return hmac.new(key, self.password_hash.encode(), hashlib.sha256).hexdigest()[:32]
+    
+    @staticmethod
+    def verify_reset_password_token(token):
+        """Return the user a reset token was issued for, or None if invalid or expired."""
+        try:
+            data = _reset_serializer().loads(
+                token, max_age=current_app.config['PASSWORD_RESET_TOKEN_MAX_AGE'])
+        except BadSignature:
+            return None
+        
+        user = db.session.get(User, data.get('user_id'))
+        if user is None or not hmac.compare_digest(user._password_fingerprint(), str(data.get('pw'))):
+            return None
+        return user
+    
     def __repr__(self):
         return f'<User {self.email}>'
 
 
+def _reset_serializer():
+    """Serializer for password reset tokens."""
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='password-reset')
+
+
 class Sunflower(db.Model):
     """User's sunflower journal."""
     
@@ -53,36 +150,384 @@ class Sunflower(db.Model):
     planted_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     theme = db.Column(db.String(20), default='yellow')  # For future customization
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    rev = db.Column(db.Integer, default=0, nullable=False)  # sync revision of the last change
+    # Last sync revision handed out for this journal (see app.sync), and
+    # the highest revision whose tombstones were pruned
+    rev_seq = db.Column(db.Integer, default=0, nullable=False)
+    pruned_rev = db.Column(db.Integer, default=0, nullable=False)
     
     # Relationships
     entries = db.relationship('JournalEntry', backref='sunflower', lazy='dynamic',
                              cascade='all, delete-orphan', order_by='JournalEntry.date.desc()')
+    archived_entries = db.relationship('ArchivedEntry', lazy='dynamic',
+                                      cascade='all, delete-orphan')
+    season_heights = db.relationship('SeasonHeight', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Sunflower {self.name} (User {self.user_id})>'
 
 
-class JournalEntry(db.Model):
+class JournalEntry(PhotoHashMixin, db.Model):
     """Individual journal entry for a sunflower."""
     
     __tablename__ = 'journal_entries'
     
     id = db.Column(db.Integer, primary_key=True)
-    sunflower_id = db.Column(db.Integer, db.ForeignKey('sunflowers.id'), nullable=False, index=True)
+    sunflower_id = db.Column(db.Integer, db.ForeignKey('sunflowers.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow, index=True)
     note = db.Column(db.Text, nullable=True)
     height_cm = db.Column(db.Float, nullable=True)
     photo_path = db.Column(db.String(255), nullable=True)
+    photo_width = db.Column(db.Integer, nullable=True)
+    photo_height = db.Column(db.Integer, nullable=True)
+    photo_placeholder = db.Column(db.Text, nullable=True)  # tiny data: URI shown while loading
+    # Earlier entry whose photo this one nearly matches, flagged for moderators at upload
+    photo_duplicate_of = db.Column(db.Integer, nullable=True, index=True)
     is_public = db.Column(db.Boolean, default=True, nullable=False, index=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # When the entry (last) became public; reset by app.community.timeline
+    published_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)
+    rev = db.Column(db.Integer, default=0, nullable=False)  # sync revision of the last change
+    client_key = db.Column(db.String(64), nullable=True)  # idempotency key of an API upload
+    # Reactions counted by app.community.reactions (batched, may briefly lag)
+    reaction_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        # A sunflower's entries in journal order (My Journal periods, timelapse)
+        db.Index('ix_journal_entries_sunflower_date', 'sunflower_id', 'date', 'created_at'),
+        # Delta sync: a sunflower's entries changed after a revision
+        db.Index('ix_journal_entries_sunflower_rev', 'sunflower_id', 'rev', 'id'),
+        db.UniqueConstraint('sunflower_id', 'client_key', name='uq_journal_entries_client_key'),
+        # Never reuse ids, so archived entries can always be restored under their own
+        {'sqlite_autoincrement': True},
+    )
     
     def __repr__(self):
         return f'<JournalEntry {self.id} for Sunflower {self.sunflower_id}>'
     
+    def set_photo(self, info):
+        """Point the entry at a stored photo (a PhotoInfo), or clear it with None."""
+        self.photo_path = info.filename if info else None
+        self.photo_width = info.width if info else None
+        self.photo_height = info.height if info else None
+        self.photo_placeholder = info.placeholder if info else None
+        self.photo_hash = info.phash if info else None
+        # A re-upload of the entry's own photo is not a duplicate
+        self.photo_duplicate_of = info.duplicate_of if info and info.duplicate_of != self.id else None
+    
     @property
     def photo_url(self):
         """Get URL for photo if it exists."""
         if self.photo_path:
             return f'/static/uploads/{self.photo_path}'
         return None
+
+
+class ArchivedEntry(PhotoHashMixin, db.Model):
+    """
+    Journal entry from a past season, moved out of journal_entries.
+    
+    Same columns as JournalEntry (ids are kept), so entries can move back
+    and forth with INSERT ... SELECT. Only read by the archive pages; the
+    feed and journal summaries never see archived entries. Managed with
+    `flask archive-entries` / `flask restore-entries`.
+    """
+    
+    __tablename__ = 'journal_entries_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sunflower_id = db.Column(db.Integer, db.ForeignKey('sunflowers.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    note = db.Column(db.Text, nullable=True)
+    height_cm = db.Column(db.Float, nullable=True)
+    photo_path = db.Column(db.String(255), nullable=True)
+    photo_width = db.Column(db.Integer, nullable=True)
+    photo_height = db.Column(db.Integer, nullable=True)
+    photo_placeholder = db.Column(db.Text, nullable=True)
+    photo_duplicate_of = db.Column(db.Integer, nullable=True)
+    is_public = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    published_at = db.Column(db.DateTime, nullable=True)
+    rev = db.Column(db.Integer, nullable=False)
+    client_key = db.Column(db.String(64), nullable=True)
+    reaction_count = db.Column(db.Integer, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_journal_entries_archive_sunflower_date', 'sunflower_id', 'date', 'created_at'),
+    )
+    
+    set_photo = JournalEntry.set_photo
+    
+    def __repr__(self):
+        return f'<ArchivedEntry {self.id} for Sunflower {self.sunflower_id}>'
+
+
+class Reaction(db.Model):
+    """
+    A user's "sunflower" on a journal entry (at most one per user and entry).
+    
+    entry_id is not a foreign key so reactions survive the entry moving to
+    the archive and back; they are deleted with the entry or the user.
+    """
+    
+    __tablename__ = 'reactions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entry_id = db.Column(db.Integer, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'entry_id', name='uq_reactions_user_entry'),
+    )
+    
+    def __repr__(self):
+        return f'<Reaction {self.user_id} on JournalEntry {self.entry_id}>'
+
+
+class FeedItem(db.Model):
+    """
+    Denormalized community feed row, one per public journal entry.
+    
+    Kept in step with entries, sunflower names and display names by
+    app.community.timeline, so the feed reads one table in index order
+    without joins. Rebuild with `flask rebuild-feed`.
+    """
+    
+    __tablename__ = 'feed_timeline'
+    
+    entry_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sunflower_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    display_name = db.Column(db.String(80), nullable=False)
+    sunflower_name = db.Column(db.String(50), nullable=False)
+    note_excerpt = db.Column(db.Text, nullable=True)
+    height_cm = db.Column(db.Float, nullable=True)
+    photo_path = db.Column(db.String(255), nullable=True)
+    photo_width = db.Column(db.Integer, nullable=True)
+    photo_height = db.Column(db.Integer, nullable=True)
+    photo_placeholder = db.Column(db.Text, nullable=True)
+    reaction_count = db.Column(db.Integer, default=0, nullable=False)
+    published_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_feed_timeline_order', 'date', 'created_at', 'entry_id'),
+        # Live updates: rows published since the last poll
+        db.Index('ix_feed_timeline_published', 'published_at', 'entry_id'),
+    )
+    
+    def __repr__(self):
+        return f'<FeedItem for JournalEntry {self.entry_id}>'
+
+
+class JournalBucket(db.Model):
+    """
+    Precomputed week or month summary of a sunflower's journal.
+    
+    Kept in step with entries by app.journal.buckets, so My Journal can
+    page through periods without touching the entries themselves.
+    Rebuild with `flask rebuild-journal-buckets`.
+    """
+    
+    __tablename__ = 'journal_buckets'
+    
+    sunflower_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    period = db.Column(db.String(5), primary_key=True)  # 'week' or 'month'
+    start = db.Column(db.Date, primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False)
+    height_delta = db.Column(db.Float, nullable=True)
+    cover_photo = db.Column(db.String(255), nullable=True)
+    
+    def __repr__(self):
+        return f'<JournalBucket {self.period} {self.start} for Sunflower {self.sunflower_id}>'
+    
+    @property
+    def label(self):
+        """Human-readable name of the period."""
+        if self.period == 'week':
+            return f"Week of {self.start.strftime('%B %d, %Y')}"
+        return self.start.strftime('%B %Y')
+    
+    @property
+    def cover_url(self):
+        """Get URL for the cover photo if there is one."""
+        if self.cover_photo:
+            return f'/static/uploads/{self.cover_photo}'
+        return None
+
+
+class SeasonHeight(db.Model):
+    """
+    Tallest recorded height of a sunflower in one season (calendar year).
+    
+    Kept in step with entries by app.community.leaderboard, so the
+    tallest-sunflowers board is an index range scan instead of a MAX over
+    every entry. Rebuild with `flask rebuild-leaderboard`.
+    """
+    
+    __tablename__ = 'season_heights'
+    
+    sunflower_id = db.Column(db.Integer, db.ForeignKey('sunflowers.id', ondelete='CASCADE'), primary_key=True)
+    season = db.Column(db.Integer, primary_key=True)
+    max_height_cm = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_season_heights_board', 'season', 'max_height_cm', 'sunflower_id'),
+    )
+    
+    def __repr__(self):
+        return f'<SeasonHeight {self.sunflower_id}/{self.season}: {self.max_height_cm} cm>'
+
+
+class OutboundEmail(db.Model):
+    """Queued email, delivered out of band by `flask send-mail`."""
+    
+    __tablename__ = 'outbound_emails'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), default='pending', nullable=False)  # pending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_outbound_emails_due', 'status', 'next_attempt_at'),
+    )
+    
+    def __repr__(self):
+        return f'<OutboundEmail {self.id} to {self.recipient} ({self.status})>'
+
+
+class BannedImage(PhotoHashMixin, db.Model):
+    """
+    Perceptual hash of a photo moderators banned.
+    
+    Uploads within PHOTO_HASH_MAX_DISTANCE bits of any banned hash are
+    rejected by save_photo (near matches of other entries' photos are only
+    flagged, see JournalEntry.photo_duplicate_of).
+    """
+    
+    __tablename__ = 'banned_images'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    banned_by_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<BannedImage {self.photo_hash:016x}>'
+
+
+class SyncTombstone(db.Model):
+    """Record of a deleted entry or sunflower, so delta sync can tell clients to drop it."""
+    
+    __tablename__ = 'sync_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # entry, sunflower
+    row_id = db.Column(db.Integer, nullable=False)
+    rev = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_sync_tombstones_user_rev', 'user_id', 'rev'),
+    )
+    
+    def __repr__(self):
+        return f'<SyncTombstone {self.kind} {self.row_id} @{self.rev}>'
+
+
+class JobCheckpoint(db.Model):
+    """Resume position of an incremental maintenance command."""
+    
+    __tablename__ = 'job_checkpoints'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), nullable=False, default='')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def load(cls, name):
+        """Get the checkpoint called `name`, creating an empty one if needed."""
+        checkpoint = db.session.get(cls, name)
+        if checkpoint is None:
+            checkpoint = cls(name=name, value='')
+            db.session.add(checkpoint)
+        return checkpoint
+    
+    def __repr__(self):
+        return f'<JobCheckpoint {self.name}={self.value!r}>'
+
+
+class Community(db.Model):
+    """A neighborhood or town group with its own feed."""
+    
+    __tablename__ = 'communities'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)
+    name = db.Column(db.String(80), nullable=False)
+    # Database bind (a SQLALCHEMY_BINDS key) holding this community's feed; None for the main database
+    bind_key = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    @property
+    def feed_table(self):
+        """The community_feed table on this community's bind."""
+        return community_feed_table(self.bind_key)
+    
+    def __repr__(self):
+        return f'<Community {self.slug}>'
+
+
+def community_feed_table(bind_key=None):
+    """
+    Get the per-community feed table on a database bind, defining it on first use.
+    
+    Every bind gets an identical table, so a large community's feed can
+    live on its own database; queries against the returned table are
+    routed to that bind by Flask-SQLAlchemy. Maintained by
+    app.community.feeds; rebuild with `flask rebuild-community-feeds`.
+    
+    Args:
+        bind_key: SQLALCHEMY_BINDS key, or None for the main database
+    
+    Returns:
+        Table: community_feed on that bind
+    """
+    metadata = db.metadatas.get(bind_key)
+    if metadata is not None and 'community_feed' in metadata.tables:
+        return metadata.tables['community_feed']
+    
+    return db.Table(
+        'community_feed',
+        db.Column('community_id', db.Integer, primary_key=True),
+        db.Column('entry_id', db.Integer, primary_key=True, autoincrement=False),
+        db.Column('user_id', db.Integer, nullable=False, index=True),
+        db.Column('sunflower_id', db.Integer, nullable=False, index=True),
+        db.Column('date', db.Date, nullable=False),
+        db.Column('created_at', db.DateTime, nullable=False),
+        db.Column('display_name', db.String(80), nullable=False),
+        db.Column('sunflower_name', db.String(50), nullable=False),
+        db.Column('note_excerpt', db.Text, nullable=True),
+        db.Column('height_cm', db.Float, nullable=True),
+        db.Column('photo_path', db.String(255), nullable=True),
+        db.Column('photo_width', db.Integer, nullable=True),
+        db.Column('photo_height', db.Integer, nullable=True),
+        db.Column('photo_placeholder', db.Text, nullable=True),
+        db.Column('reaction_count', db.Integer, default=0, nullable=False),
+        db.Index('ix_community_feed_order', 'community_id', 'date', 'created_at', 'entry_id'),
+        bind_key=bind_key,
+    )
+
+
+community_feed = community_feed_table()
@@ -0,0 +1,85 @@
+"""Cursor (keyset) pagination helpers."""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import literal, tuple_
+
+
+def encode_cursor(values):
+    """Encode a list of sort-key values into an opaque URL-safe cursor."""
+    payload = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: Cursor string from the request (may be None)
+        columns: Sort columns the cursor was built from
+
+    Returns:
+        list: Typed sort-key values, or None if the cursor is missing or invalid
+    """
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        return None
+
+    values = []
+    for value, column in zip(payload, columns):
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            else:
+                value = python_type(value)
+        except (TypeError, ValueError):
+            return None
+        values.append(value)
+    return values
+
+
+def paginate_keyset(query, columns, cursor, per_page):
+    """
+    Fetch one page of a query in descending order of `columns`.
+
+    Unlike OFFSET pagination, the cost of fetching a page does not grow with
+    how far the reader has scrolled: the cursor turns into a range condition
+    on the sort columns.
+
+    Args:
+        query: Query to paginate (without ORDER BY)
+        columns: Sort columns, most significant first; the last must be unique
+        cursor: Cursor from a previous page, or None for the first page
+        per_page: Number of items per page
+
+    Returns:
+        tuple: (items, next_cursor) where next_cursor is None on the last page
+    """
+    values = decode_cursor(cursor, columns)
+    if values is not None:
+        bounds = [literal(v, type_=c.type) for v, c in zip(values, columns)]
+        query = query.filter(tuple_(*columns) < tuple_(*bounds))
+
+    items = query.order_by(*[c.desc() for c in columns]).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getattr(items[-1], c.key) for c in columns])
+
+    return items, next_cursor
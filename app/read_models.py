@@ -0,0 +1,92 @@
+"""Compact, read-only rows for list views.
+
+List pages select just the columns a card or table row shows and build
+EntryCard objects from them, instead of hydrating JournalEntry instances
+(with their full notes) into the session's identity map.
+"""
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import case, func
+
+from app import db
+from app.models import FeedItem, JournalEntry, Sunflower, User
+
+# Longest note shown in a list before it is cut off with an ellipsis
+EXCERPT_LENGTH = 280
+
+
+def note_excerpt(column, length=EXCERPT_LENGTH):
+    """SQL expression shortening a note column to `length` characters plus an ellipsis."""
+    return case(
+        (func.length(column) > length, func.substr(column, 1, length).concat('…')),
+        else_=column,
+    )
+
+
+class EntryCard(NamedTuple):
+    """What an entry card or listing row shows about one journal entry."""
+    id: int
+    sunflower_id: int
+    date: date
+    created_at: datetime
+    note: Optional[str]  # excerpt, see EXCERPT_LENGTH
+    height_cm: Optional[float]
+    photo_path: Optional[str]
+    photo_width: Optional[int]
+    photo_height: Optional[int]
+    photo_placeholder: Optional[str]
+    is_public: bool
+    display_name: str
+    sunflower_name: str
+    reaction_count: int
+    photo_duplicate_of: Optional[int] = None  # entry queries only, see JournalEntry
+    
+    @property
+    def photo_url(self):
+        """Get URL for photo if it exists."""
+        if self.photo_path:
+            return f'/static/uploads/{self.photo_path}'
+        return None
+
+
+def to_cards(rows):
+    """Build EntryCards from rows selected by entry_card_query or feed_card_query."""
+    return [EntryCard(*row) for row in rows]
+
+
+def entry_card_query(model=JournalEntry):
+    """
+    Query for EntryCard rows straight from journal entries.
+    
+    Args:
+        model: JournalEntry, or ArchivedEntry for past seasons
+    
+    Returns:
+        Query: Rows in EntryCard field order; filter, order and page it as usual
+    """
+    return db.session.query(
+        model.id, model.sunflower_id, model.date, model.created_at,
+        note_excerpt(model.note), model.height_cm, model.photo_path,
+        model.photo_width, model.photo_height, model.photo_placeholder,
+        model.is_public, User.display_name, Sunflower.name, model.reaction_count,
+        model.photo_duplicate_of,
+    ) \
+        .select_from(model) \
+        .join(Sunflower, model.sunflower_id == Sunflower.id) \
+        .join(User, Sunflower.user_id == User.id)
+
+
+def feed_card_query():
+    """
+    Query for EntryCard rows from the community feed timeline.
+    
+    Returns:
+        Query: Rows in EntryCard field order (notes are already excerpts)
+    """
+    return db.session.query(
+        FeedItem.entry_id, FeedItem.sunflower_id, FeedItem.date, FeedItem.created_at,
+        FeedItem.note_excerpt, FeedItem.height_cm, FeedItem.photo_path,
+        FeedItem.photo_width, FeedItem.photo_height, FeedItem.photo_placeholder,
+        db.literal(True), FeedItem.display_name, FeedItem.sunflower_name, FeedItem.reaction_count,
+    )
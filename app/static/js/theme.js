@@ -0,0 +1,25 @@
+(() => {
+    const root = document.documentElement;
+    const toggle = document.getElementById('theme-toggle');
+    if (!toggle) return;
+
+    const storageKey = 'sunflower-theme';
+
+    const applyTheme = (theme) => {
+        const resolved = theme === 'lunar' ? 'lunar' : 'solar';
+        const picoTheme = resolved === 'lunar' ? 'dark' : 'light';
+        root.setAttribute('data-sun-theme', resolved);
+        root.setAttribute('data-theme', picoTheme);
+        toggle.textContent = `Theme: ${resolved === 'lunar' ? 'Lunar' : 'Solar'}`;
+    };
+
+    const savedTheme = localStorage.getItem(storageKey);
+    applyTheme(savedTheme || 'solar');
+
+    toggle.addEventListener('click', () => {
+        const currentTheme = root.getAttribute('data-sun-theme') === 'lunar' ? 'lunar' : 'solar';
+        const nextTheme = currentTheme === 'solar' ? 'lunar' : 'solar';
+        applyTheme(nextTheme);
+        localStorage.setItem(storageKey, nextTheme);
+    });
+})();
@@ -0,0 +1,185 @@
+"""Revision stamping and change queries behind the delta sync API.
+
+Sync is scoped to one user's journal, so each sunflower counts its own
+revisions in sunflowers.rev_seq. Every flush that creates, changes or
+deletes a journal's entries (or the sunflower itself) takes that
+journal's next revision and stamps it on the rows it writes (and on
+tombstones for the rows it deletes). A client that has seen revision N
+asks for rows stamped after N.
+
+The sunflower row is updated inside the writing transaction, so it stays
+locked until that transaction ends and a journal's revisions become
+visible in the order they were handed out: a client can never see N + 1
+before N. Writes to different journals never wait on each other.
+"""
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, event, func, select, update
+
+from app import db
+from app.models import JournalEntry, Sunflower, SyncTombstone
+
+sunflowers = Sunflower.__table__
+
+
+def next_revision(connection, sunflower_id):
+    """Take a journal's next sync revision (locks its sunflower row until the transaction ends)."""
+    return connection.scalar(update(sunflowers)
+                             .where(sunflowers.c.id == sunflower_id)
+                             .values(rev_seq=sunflowers.c.rev_seq + 1)
+                             .returning(sunflowers.c.rev_seq))
+
+
+def _journal(session, obj):
+    """The sunflower whose journal a synced row belongs to (may not be flushed yet)."""
+    if isinstance(obj, Sunflower):
+        return obj
+    # Pending entries only know their sunflower_id
+    return obj.sunflower or session.get(Sunflower, obj.sunflower_id)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _stamp_revisions(session, flush_context, instances):
+    """Stamp one new revision per journal on every synced row this flush writes or deletes."""
+    changed = [obj for obj in session.new if isinstance(obj, (JournalEntry, Sunflower))]
+    changed += [obj for obj in session.dirty
+                if isinstance(obj, (JournalEntry, Sunflower)) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, (JournalEntry, Sunflower))]
+    if not changed and not deleted:
+        return
+    
+    revisions = {}
+    
+    def revision(sunflower):
+        if sunflower not in revisions:
+            if sunflower in session.new:
+                # Inserted by this flush, so nobody else can be writing to it
+                sunflower.rev_seq = revisions[sunflower] = 1
+            elif sunflower in session.deleted:
+                # Its counter goes with it; the tombstone only has to sort last
+                revisions[sunflower] = (sunflower.rev_seq or 0) + 1
+            else:
+                revisions[sunflower] = next_revision(session.connection(), sunflower.id)
+        return revisions[sunflower]
+    
+    for obj in changed:
+        sunflower = _journal(session, obj)
+        if sunflower is not None:
+            obj.rev = revision(sunflower)
+    for obj in deleted:
+        sunflower = _journal(session, obj)
+        if sunflower is None:
+            continue
+        if isinstance(obj, JournalEntry):
+            if sunflower in session.deleted:
+                # The whole journal is going; its own tombstone covers the entries
+                continue
+            tombstone = SyncTombstone(user_id=sunflower.user_id, kind='entry', row_id=obj.id,
+                                      rev=revision(sunflower))
+        else:
+            tombstone = SyncTombstone(user_id=obj.user_id, kind='sunflower', row_id=obj.id,
+                                      rev=revision(sunflower))
+        session.add(tombstone)
+
+
+def changes(user, since, limit):
+    """
+    What changed in a user's journal after revision `since`.
+    
+    Entries come in revision order, at most `limit` of them unless a
+    single revision holds more; a page never splits a revision, so the
+    returned `rev` is always safe to resume from.
+    
+    Args:
+        user: User whose sunflower and entries to sync
+        since: Last revision the client has, or 0 for everything
+        limit: Largest number of entries to return
+    
+    Returns:
+        dict: rev, reset, more, sunflower, entries, deleted (see the API docs)
+    """
+    connection = db.session.connection()
+    sunflower = user.sunflower
+    latest, pruned = 0, 0
+    if sunflower:
+        # Read fresh: the counter is bumped with Core statements
+        latest, pruned = connection.execute(
+            select(sunflowers.c.rev_seq, sunflowers.c.pruned_rev)
+            .where(sunflowers.c.id == sunflower.id)).one()
+    # Deletions before the pruned horizon are gone: start the client over
+    reset = since > latest or 0 < since < pruned
+    if reset:
+        since = 0
+    # Rows written before revisions existed carry revision 0
+    after = since or -1
+    
+    entries = []
+    if sunflower:
+        entries = JournalEntry.query \
+            .filter(JournalEntry.sunflower_id == sunflower.id, JournalEntry.rev > after) \
+            .order_by(JournalEntry.rev, JournalEntry.id) \
+            .limit(limit + 1) \
+            .all()
+    
+    more = len(entries) > limit
+    rev = latest
+    if more:
+        # Stop before the revision the limit cut into
+        first_rev, rev = entries[0].rev, entries[limit].rev - 1
+        entries = [entry for entry in entries if entry.rev <= rev]
+        if not entries:
+            # A single revision holds more than `limit` entries: send all of it
+            rev = first_rev
+            entries = JournalEntry.query \
+                .filter(JournalEntry.sunflower_id == sunflower.id, JournalEntry.rev == rev) \
+                .order_by(JournalEntry.id) \
+                .all()
+            more = db.session.query(JournalEntry.query.filter(
+                JournalEntry.sunflower_id == sunflower.id, JournalEntry.rev > rev).exists()).scalar()
+    
+    tombstones = [] if not since else connection.execute(
+        select(SyncTombstone.kind, SyncTombstone.row_id)
+        .where(SyncTombstone.user_id == user.id, SyncTombstone.rev > since,
+               SyncTombstone.rev <= rev)).all()
+    
+    return {
+        'rev': rev,
+        'reset': reset,
+        'more': more,
+        'sunflower': sunflower if sunflower and after < sunflower.rev <= rev else None,
+        'entries': entries,
+        'deleted': {
+            'entries': [row_id for kind, row_id in tombstones if kind == 'entry'],
+            'sunflowers': [row_id for kind, row_id in tombstones if kind == 'sunflower'],
+        },
+    }
+
+
+def prune_tombstones(older_than):
+    """
+    Delete tombstones older than `older_than` (a timedelta).
+    
+    Each journal records the newest revision pruned from it; clients
+    that last synced before it are told to reset, since they could have
+    missed a deletion.
+    
+    Returns:
+        int: Number of tombstones deleted
+    """
+    cutoff = datetime.utcnow() - older_than
+    horizons = [{'b_user_id': user_id, 'b_rev': rev} for user_id, rev in db.session.execute(
+        select(SyncTombstone.user_id, func.max(SyncTombstone.rev))
+        .where(SyncTombstone.created_at < cutoff)
+        .group_by(SyncTombstone.user_id))]
+    if not horizons:
+        return 0
+    
+    connection = db.session.connection()
+    deleted = connection.execute(delete(SyncTombstone).where(SyncTombstone.created_at < cutoff)).rowcount
+    connection.execute(
+        update(sunflowers)
+        .where(sunflowers.c.user_id == bindparam('b_user_id'), sunflowers.c.pruned_rev < bindparam('b_rev'))
+        .values(pruned_rev=bindparam('b_rev')),
+        horizons)
+    db.session.commit()
+    return deleted
@@ -22,6 +22,16 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 5 * 1024 * 1024))  # 5MB
     ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
     MAX_IMAGE_DIMENSION = int(os.environ.get('MAX_IMAGE_DIMENSION', 1200))
+    PHOTO_QUALITY = int(os.environ.get('PHOTO_QUALITY', 85))
+    PHOTO_FORMAT = os.environ.get('PHOTO_FORMAT')  # e.g. 'webp'; None keeps the uploaded format
+    # Photos whose perceptual hashes differ in at most this many bits count as the same image
+    PHOTO_HASH_MAX_DISTANCE = int(os.environ.get('PHOTO_HASH_MAX_DISTANCE', 6))
+    TIMELAPSE_FOLDER = BASE_DIR / 'app' / 'static' / 'timelapses'
+    TIMELAPSE_SIZE = int(os.environ.get('TIMELAPSE_SIZE', 480))  # pixels per side
+    TIMELAPSE_FRAME_MS = int(os.environ.get('TIMELAPSE_FRAME_MS', 400))
+    TIMELAPSE_LOCK_TIMEOUT = int(os.environ.get('TIMELAPSE_LOCK_TIMEOUT', 600))  # seconds before a build is presumed dead
+    UPLOAD_QUARANTINE_FOLDER = BASE_DIR / 'instance' / 'upload_quarantine'
+    UPLOAD_ORPHAN_GRACE = int(os.environ.get('UPLOAD_ORPHAN_GRACE', 3600))  # seconds
     
     # Email configuration (for password reset)
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
@@ -31,9 +41,45 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@sunflowerjournal.com')
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 6))
+    MAIL_RETRY_DELAY = int(os.environ.get('MAIL_RETRY_DELAY', 30))  # seconds, doubled per attempt
+    MAIL_POLL_INTERVAL = float(os.environ.get('MAIL_POLL_INTERVAL', 2))  # seconds
+    MAIL_IDLE_TIMEOUT = float(os.environ.get('MAIL_IDLE_TIMEOUT', 60))  # seconds before closing SMTP
+    PASSWORD_RESET_TOKEN_MAX_AGE = int(os.environ.get('PASSWORD_RESET_TOKEN_MAX_AGE', 3600))  # seconds
+    
+    # Templates: compiled bytecode shared by all workers (None disables)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR') or \
+        BASE_DIR / 'instance' / 'jinja_cache'
+    
+    # Static assets and response compression
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # bytes; smaller bodies go out as-is
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    STATIC_IMMUTABLE_MAX_AGE = int(os.environ.get('STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 3600))  # seconds
+    
+    # Archive: seasons (calendar years) kept in journal_entries, counting the current one
+    ARCHIVE_KEEP_SEASONS = int(os.environ.get('ARCHIVE_KEEP_SEASONS', 2))
     
     # Pagination
     ENTRIES_PER_PAGE = int(os.environ.get('ENTRIES_PER_PAGE', 20))
+    JOURNAL_PERIODS_PER_PAGE = int(os.environ.get('JOURNAL_PERIODS_PER_PAGE', 4))
+    
+    # Live feed (server-sent events)
+    FEED_LIVE_POLL_INTERVAL = float(os.environ.get('FEED_LIVE_POLL_INTERVAL', 2))  # seconds
+    FEED_LIVE_HEARTBEAT = float(os.environ.get('FEED_LIVE_HEARTBEAT', 15))  # seconds
+    FEED_LIVE_QUEUE_SIZE = int(os.environ.get('FEED_LIVE_QUEUE_SIZE', 50))  # per client
+    # How far back each poll looks for entries committed after later-stamped ones (seconds)
+    FEED_LIVE_OVERLAP = float(os.environ.get('FEED_LIVE_OVERLAP', 30))
+    
+    # Community feeds; large communities can keep theirs on a SQLALCHEMY_BINDS database
+    COMMUNITY_FEED_CACHE_TTL = float(os.environ.get('COMMUNITY_FEED_CACHE_TTL', 10))  # seconds; 0 disables
+    LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', 20))
+    LEADERBOARD_CACHE_TTL = float(os.environ.get('LEADERBOARD_CACHE_TTL', 60))  # seconds; 0 disables
+    REACTION_FLUSH_INTERVAL = float(os.environ.get('REACTION_FLUSH_INTERVAL', 2))  # seconds; 0 counts at once
+    REACTION_FLUSH_SIZE = int(os.environ.get('REACTION_FLUSH_SIZE', 500))  # pending entries that force a flush
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 200))  # entries per /api/v1/sync response
+    SYNC_UPLOAD_LIMIT = int(os.environ.get('SYNC_UPLOAD_LIMIT', 50))  # entries per batch upload
+    SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 90))
     
     # Admin
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL')
@@ -55,6 +101,9 @@ class ProductionConfig(Config):
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Templates are precompiled at build time and never change in place
+    TEMPLATES_AUTO_RELOAD = False
+    
     # Require real secret key
     SECRET_KEY = os.environ['SECRET_KEY']
 
@@ -64,6 +113,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    JINJA_BYTECODE_CACHE_DIR = None
+    REACTION_FLUSH_INTERVAL = 0  # no background flusher sharing the in-memory database
 
 
 config = {
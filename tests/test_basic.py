@@ -1,9 +1,28 @@
 """Basic tests for Sunflower Journal."""
+import base64
+import gzip
 import io
-from datetime import date
+import os
+import re
+import smtplib
+import time
+from datetime import date, datetime, timedelta
 import pytest
+from flask import url_for
+from jinja2 import FileSystemBytecodeCache
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
 from app import create_app, db
-from app.models import User, Sunflower, JournalEntry
+from config import TestingConfig
+from app.assets import build_assets
+from app.community import feeds
+from app.community.live import FeedBroker, Subscription
+from app.journal import timelapse
+from app.journal.utils import delete_photo
+from app.mail import MailSender, enqueue_email
+from app.models import (User, Sunflower, JournalEntry, ArchivedEntry, FeedItem, JournalBucket,
+                        OutboundEmail, Community, Reaction, SeasonHeight, SyncTombstone,
+                        community_feed_table)
 
 
 @pytest.fixture
@@ -175,6 +194,45 @@ def test_photo_validation_rejects_invalid_image_bytes(auth_client):
         assert JournalEntry.query.count() == 0
 
 
+def test_uploaded_photo_renders_with_dimensions_and_placeholder(auth_client, tmp_path):
+    """save_photo records size and a placeholder that the feed renders inline."""
+    auth_client.application.config['UPLOAD_FOLDER'] = tmp_path
+    upload = io.BytesIO()
+    Image.new('RGB', (300, 200), 'orange').save(upload, 'JPEG')
+    upload.seek(0)
+    
+    auth_client.post('/entry/new', data={'date': '2026-02-13', 'photo': (upload, 'flower.jpg')},
+                     content_type='multipart/form-data')
+    
+    entry = JournalEntry.query.one()
+    assert (entry.photo_width, entry.photo_height) == (300, 200)
+    assert entry.photo_placeholder.startswith('data:image/')
+    html = auth_client.get('/community/').get_data(as_text=True)
+    assert 'width="300" height="200"' in html
+    assert entry.photo_placeholder in html
+
+
+def test_backfill_photo_info_command(auth_client, tmp_path):
+    """backfill-photo-info fills in photos stored before dimensions were recorded."""
+    app = auth_client.application
+    app.config['UPLOAD_FOLDER'] = tmp_path
+    Image.new('RGB', (64, 48), 'green').save(tmp_path / 'old.png')
+    
+    user = User.query.filter_by(email='test@example.com').first()
+    stored = JournalEntry(sunflower_id=user.sunflower.id, photo_path='old.png')
+    lost = JournalEntry(sunflower_id=user.sunflower.id, photo_path='gone.png')
+    db.session.add_all([stored, lost])
+    db.session.commit()
+    
+    result = app.test_cli_runner().invoke(args=['backfill-photo-info'])
+    
+    assert result.exit_code == 0, result.output
+    assert 'Updated 1 entries; 1 photos' in result.output
+    assert (stored.photo_width, stored.photo_height) == (64, 48)
+    assert db.session.get(FeedItem, stored.id).photo_placeholder == stored.photo_placeholder
+    assert lost.photo_width is None
+
+
 def test_edit_entry_page_renders_with_csrf(auth_client):
     """Editing an existing entry should render without CSRF template errors."""
     with auth_client.application.app_context():
@@ -191,3 +249,785 @@ def test_edit_entry_page_renders_with_csrf(auth_client):
     response = auth_client.get(f'/entry/{entry_id}/edit')
     assert response.status_code == 200
     assert b'Delete Entry' in response.data
+
+
+def _add_entries(app, count):
+    """Add `count` public entries to the test user's journal."""
+    with app.app_context():
+        user = User.query.filter_by(email='test@example.com').first()
+        for day in range(1, count + 1):
+            db.session.add(JournalEntry(
+                sunflower_id=user.sunflower.id,
+                date=date(2026, 3, 1) + timedelta(days=day),
+                note=f'Day {day}'
+            ))
+        db.session.commit()
+
+
+def test_feed_fragment_pages_with_cursor(auth_client):
+    """Feed fragments return the next batch of cards without the layout."""
+    _add_entries(auth_client.application, 25)
+
+    response = auth_client.get('/community/')
+    assert response.status_code == 200
+    assert b'Day 25' in response.data
+    assert b'Day 5<' not in response.data
+    assert b'hx-trigger="revealed"' in response.data
+
+    cursor = re.search(rb'cursor=([\w-]+)', response.data).group(1).decode()
+    fragment = auth_client.get(f'/community/entries?cursor={cursor}')
+    assert fragment.status_code == 200
+    assert b'<nav' not in fragment.data
+    assert b'Day 5<' in fragment.data
+    assert b'Day 25' not in fragment.data
+    assert b'hx-trigger="revealed"' not in fragment.data
+
+
+def test_journal_fragment_ignores_bad_cursor(auth_client):
+    """An unparseable cursor falls back to the first batch."""
+    _add_entries(auth_client.application, 3)
+
+    response = auth_client.get('/my-journal/periods?cursor=not-a-cursor')
+    assert response.status_code == 200
+    assert b'March 2026' in response.data
+    assert b'<html' not in response.data
+
+
+def test_admin_entries_uses_shared_entry_card(auth_client):
+    """Admin moderation renders entries with the shared card macro."""
+    _add_entries(auth_client.application, 2)
+    user = User.query.filter_by(email='test@example.com').first()
+    user.is_admin = True
+    db.session.commit()
+
+    response = auth_client.get('/admin/entries')
+    assert response.status_code == 200
+    assert b'class="entry-card"' in response.data
+    assert b"Test User</strong>'s" in response.data
+
+
+def test_list_views_use_compact_rows(auth_client):
+    """List views render from column rows, leaving no entries in the session and cutting long notes."""
+    user = User.query.filter_by(email='test@example.com').first()
+    user.is_admin = True
+    db.session.add(JournalEntry(sunflower_id=user.sunflower.id, date=date(2026, 3, 2),
+                                note='sunflower ' * 100))
+    db.session.commit()
+    
+    def loaded_entries():
+        return [obj for obj in db.session.identity_map.values()
+                if isinstance(obj, (JournalEntry, FeedItem))]
+    
+    for url in ('/community/', '/my-journal/month/2026-03-01', '/admin/', '/admin/entries'):
+        for obj in loaded_entries():
+            db.session.expunge(obj)
+        response = auth_client.get(url)
+        assert response.status_code == 200, url
+        assert not loaded_entries(), url
+        if url != '/admin/':
+            assert 'sunflower …' in response.get_data(as_text=True), url
+
+
+def test_precompile_templates_command(app, tmp_path):
+    """precompile-templates writes bytecode for every template."""
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(tmp_path))
+
+    result = app.test_cli_runner().invoke(args=['precompile-templates'])
+
+    assert result.exit_code == 0
+    assert len(list(tmp_path.iterdir())) == len(app.jinja_env.list_templates())
+
+
+def test_feed_timeline_follows_entry_changes(auth_client):
+    """Timeline rows track entry edits, renames, privacy and deletion."""
+    _add_entries(auth_client.application, 2)
+    entry = JournalEntry.query.filter_by(note='Day 1').first()
+    entry.note = 'x' * 300
+    User.query.filter_by(email='test@example.com').first().display_name = 'Renamed'
+    db.session.commit()
+
+    item = db.session.get(FeedItem, entry.id)
+    assert item.display_name == 'Renamed'
+    assert item.note_excerpt == 'x' * 280 + '…'
+
+    entry.is_public = False
+    db.session.commit()
+    assert db.session.get(FeedItem, entry.id) is None
+
+    db.session.delete(JournalEntry.query.filter_by(note='Day 2').first())
+    db.session.commit()
+    assert FeedItem.query.count() == 0
+
+
+def test_rebuild_feed_command(auth_client):
+    """rebuild-feed restores missing timeline rows."""
+    _add_entries(auth_client.application, 3)
+    FeedItem.query.delete()
+    db.session.commit()
+
+    result = auth_client.application.test_cli_runner().invoke(args=['rebuild-feed'])
+
+    assert result.exit_code == 0
+    assert FeedItem.query.count() == 3
+    assert b'Day 3' in auth_client.get('/community/').data
+
+
+def test_journal_buckets_summarize_periods(auth_client):
+    """Week and month summaries track counts and height changes."""
+    user = User.query.filter_by(email='test@example.com').first()
+    for day, height in [(2, 10.0), (3, None), (9, 14.5)]:
+        db.session.add(JournalEntry(sunflower_id=user.sunflower.id,
+                                    date=date(2026, 3, day), height_cm=height))
+    db.session.commit()
+
+    month = db.session.get(JournalBucket, (user.sunflower.id, 'month', date(2026, 3, 1)))
+    assert month.entry_count == 3
+    assert month.height_delta == 4.5
+    week = db.session.get(JournalBucket, (user.sunflower.id, 'week', date(2026, 3, 2)))
+    assert week.entry_count == 2
+
+    moved = JournalEntry.query.filter_by(date=date(2026, 3, 9)).first()
+    moved.date = date(2026, 4, 1)
+    db.session.commit()
+    assert month.entry_count == 2
+    assert month.height_delta is None
+
+    response = auth_client.get('/my-journal?group=week')
+    assert b'Week of March 02, 2026' in response.data
+    assert b'/my-journal/week/2026-03-02' in response.data
+
+    response = auth_client.get('/my-journal/week/2026-03-02')
+    assert response.status_code == 200
+    assert response.data.count(b'class="entry-card"') == 2
+
+
+def test_rebuild_journal_buckets_command(auth_client):
+    """rebuild-journal-buckets restores missing summaries."""
+    _add_entries(auth_client.application, 3)
+    JournalBucket.query.delete()
+    db.session.commit()
+
+    result = auth_client.application.test_cli_runner().invoke(args=['rebuild-journal-buckets'])
+
+    assert result.exit_code == 0
+    assert JournalBucket.query.filter_by(period='month').one().entry_count == 3
+
+
+def test_feed_broker_fans_out_and_drops_slow_clients(auth_client):
+    """The broker pushes new timeline rows and drops clients that fall behind."""
+    app = auth_client.application
+    app.config['FEED_LIVE_QUEUE_SIZE'] = 2
+    broker = FeedBroker()
+    broker.init_app(app)
+    fast, slow = Subscription(2), Subscription(2)
+    broker.subscribers.update({fast, slow})
+
+    broker.poll_once()
+    _add_entries(app, 2)
+    assert [item.note for item in broker.poll_once()] == ['Day 1', 'Day 2']
+    assert fast.get(timeout=0).note == 'Day 1'
+    assert fast.get(timeout=0).note == 'Day 2'
+
+    _add_entries(app, 1)
+    broker.poll_once()
+    assert slow.dropped
+    assert broker.subscribers == {fast}
+
+
+def test_feed_broker_catches_late_commits_and_newly_public_entries(auth_client):
+    """Entries committed out of order or made public later are pushed exactly once."""
+    app = auth_client.application
+    broker = FeedBroker()
+    broker.init_app(app)
+    subscription = Subscription(10)
+    broker.subscribers.add(subscription)
+    user = User.query.filter_by(email='test@example.com').first()
+    hidden = JournalEntry(sunflower_id=user.sunflower.id, note='Hidden', is_public=False)
+    db.session.add(hidden)
+    db.session.commit()
+    broker.poll_once()
+    
+    _add_entries(app, 1)
+    assert [item.note for item in broker.poll_once()] == ['Day 1']
+    
+    # Stamped before the row just published (a slow transaction), committed after it
+    late = JournalEntry(sunflower_id=user.sunflower.id, note='Late',
+                        published_at=broker.watermark - timedelta(seconds=5))
+    db.session.add(late)
+    db.session.commit()
+    hidden.is_public = True
+    db.session.commit()
+    assert [item.note for item in broker.poll_once()] == ['Late', 'Hidden']
+    assert broker.poll_once() == []
+
+class FakeSMTP:
+    """Stand-in for smtplib.SMTP that records connections and messages."""
+
+    connections = []
+    fail_for = set()
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        FakeSMTP.connections.append(self)
+
+    def send_message(self, message):
+        if message['To'] in FakeSMTP.fail_for:
+            raise smtplib.SMTPServerDisconnected('connection lost')
+        self.sent.append(message)
+
+    def quit(self):
+        pass
+
+
+def test_password_reset_flow_queues_mail(client, monkeypatch):
+    """A reset request queues a token email; the token resets the password once."""
+    user = User(email='reset@example.com', display_name='Reset Me')
+    user.set_password('oldpassword')
+    db.session.add(user)
+    db.session.commit()
+
+    response = client.post('/auth/reset-password-request',
+                           data={'email': 'reset@example.com'}, follow_redirects=True)
+    assert b'Password reset instructions have been sent' in response.data
+
+    message = OutboundEmail.query.one()
+    assert message.status == 'pending'
+    token = re.search(r'/auth/reset-password/(\S+)', message.body).group(1)
+    # The payload is readable without the key: no part of the hash may be in it
+    payload = base64.urlsafe_b64decode(token.split('.')[0] + '==').decode()
+    assert user.password_hash[-16:] not in payload and '$argon2' not in payload
+
+    response = client.post(f'/auth/reset-password/{token}', data={
+        'password': 'newpassword',
+        'password_confirm': 'newpassword'
+    }, follow_redirects=True)
+    assert b'Your password has been reset.' in response.data
+    assert User.query.filter_by(email='reset@example.com').one().check_password('newpassword')
+
+    response = client.get(f'/auth/reset-password/{token}', follow_redirects=True)
+    assert b'invalid or has expired' in response.data
+
+
+def test_mail_sender_batches_and_backs_off(app, monkeypatch):
+    """The sender reuses one connection per batch and backs off failures."""
+    monkeypatch.setattr(smtplib, 'SMTP', FakeSMTP)
+    monkeypatch.setattr(FakeSMTP, 'connections', [])
+    monkeypatch.setattr(FakeSMTP, 'fail_for', {'down@example.com'})
+    for recipient in ['a@example.com', 'b@example.com', 'down@example.com']:
+        enqueue_email(recipient, 'Hello', 'Body')
+    db.session.commit()
+
+    sender = MailSender(app.config)
+    assert sender.send_batch() == 3
+
+    assert len(FakeSMTP.connections[0].sent) == 2
+    assert OutboundEmail.query.filter_by(status='sent').count() == 2
+    failed = OutboundEmail.query.filter_by(recipient='down@example.com').one()
+    assert failed.status == 'pending'
+    assert failed.attempts == 1
+    assert failed.next_attempt_at > datetime.utcnow()
+    assert sender.send_batch() == 0
+    
+    # A message that can't even be built fails alone instead of stopping the batch
+    enqueue_email('bad\n@example.com', 'Hello', 'Body')
+    enqueue_email('c@example.com', 'Hello', 'Body')
+    db.session.commit()
+    assert sender.send_batch() == 2
+    assert OutboundEmail.query.filter_by(recipient='bad\n@example.com').one().status == 'failed'
+    assert OutboundEmail.query.filter_by(status='sent').count() == 3
+
+
+def test_reconcile_uploads_quarantines_orphans(auth_client, tmp_path):
+    """reconcile-uploads moves old orphans aside and flags missing photos."""
+    app = auth_client.application
+    app.config['UPLOAD_FOLDER'] = tmp_path / 'uploads'
+    app.config['UPLOAD_QUARANTINE_FOLDER'] = tmp_path / 'quarantine'
+    app.config['UPLOAD_FOLDER'].mkdir()
+    for name in ['kept.jpg', 'orphan.jpg', 'fresh.jpg']:
+        (app.config['UPLOAD_FOLDER'] / name).write_bytes(b'jpg')
+    old = time.time() - 2 * app.config['UPLOAD_ORPHAN_GRACE']
+    os.utime(app.config['UPLOAD_FOLDER'] / 'orphan.jpg', (old, old))
+
+    user = User.query.filter_by(email='test@example.com').first()
+    for photo in ['kept.jpg', 'gone.jpg']:
+        db.session.add(JournalEntry(sunflower_id=user.sunflower.id, photo_path=photo))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['reconcile-uploads', '--batch-size', '2'])
+
+    assert result.exit_code == 0
+    assert 'quarantined 1 orphans' in result.output
+    assert 'gone.jpg' in result.output
+    assert (tmp_path / 'quarantine' / 'orphan.jpg').exists()
+    assert sorted(p.name for p in app.config['UPLOAD_FOLDER'].iterdir()) == ['fresh.jpg', 'kept.jpg']
+
+
+def test_reprocess_photos_shrinks_library(auth_client, tmp_path):
+    """reprocess-photos applies new size limits and repoints entries, archived ones included."""
+    app = auth_client.application
+    app.config['UPLOAD_FOLDER'] = tmp_path
+    app.config['MAX_IMAGE_DIMENSION'] = 100
+    Image.new('RGB', (400, 300), 'yellow').save(tmp_path / 'big.jpg')
+    Image.new('RGB', (400, 300), 'green').save(tmp_path / 'old.jpg')
+
+    user = User.query.filter_by(email='test@example.com').first()
+    entry = JournalEntry(sunflower_id=user.sunflower.id, photo_path='big.jpg')
+    db.session.add_all([entry, JournalEntry(sunflower_id=user.sunflower.id, date=date(2024, 7, 1),
+                                            photo_path='old.jpg')])
+    db.session.commit()
+    app.test_cli_runner().invoke(args=['archive-entries', '--before', '2025-01-01'])
+
+    result = app.test_cli_runner().invoke(args=['reprocess-photos', '--workers', '1'])
+
+    assert result.exit_code == 0, result.output
+    assert '2 replaced' in result.output
+    assert ArchivedEntry.query.one().photo_width == 100
+    assert not (tmp_path / 'old.jpg').exists()
+    assert entry.photo_path != 'big.jpg'
+    assert not (tmp_path / 'big.jpg').exists()
+    with Image.open(tmp_path / entry.photo_path) as image:
+        assert image.size == (100, 75)
+    assert (entry.photo_width, entry.photo_height) == (100, 75)
+    assert db.session.get(FeedItem, entry.id).photo_path == entry.photo_path
+
+
+def test_archive_and_restore_past_seasons(auth_client):
+    """Archived entries leave the journal, feed and summaries but stay readable; restore brings them back."""
+    app = auth_client.application
+    user = User.query.filter_by(email='test@example.com').first()
+    db.session.add_all([
+        JournalEntry(sunflower_id=user.sunflower.id, date=date(2024, 7, 1), note='Old season'),
+        JournalEntry(sunflower_id=user.sunflower.id, date=date(2026, 7, 1), note='This season'),
+    ])
+    db.session.commit()
+    
+    result = app.test_cli_runner().invoke(args=['archive-entries', '--before', '2025-01-01'])
+    
+    assert result.exit_code == 0, result.output
+    assert 'Archived 1 entries' in result.output
+    assert [e.note for e in JournalEntry.query] == ['This season']
+    assert [i.note_excerpt for i in FeedItem.query] == ['This season']
+    assert JournalBucket.query.filter(JournalBucket.start < date(2025, 1, 1)).count() == 0
+    assert 'Past seasons' in auth_client.get('/my-journal').get_data(as_text=True)
+    html = auth_client.get('/my-journal/archive').get_data(as_text=True)
+    assert '2024 (1)' in html and 'Old season' in html
+    assert auth_client.get('/my-journal/archive/0').status_code == 404
+    assert auth_client.get('/my-journal/archive/9999/entries').status_code == 404
+    
+    result = app.test_cli_runner().invoke(args=['restore-entries', '--since', '2024-01-01'])
+    
+    assert 'Restored 1 entries' in result.output
+    assert ArchivedEntry.query.count() == 0
+    assert FeedItem.query.count() == 2
+    assert JournalBucket.query.filter_by(period='month', start=date(2024, 7, 1)).count() == 1
+
+
+def test_timelapse_builds_in_background_and_caches(auth_client, tmp_path):
+    """The timelapse is built off-request, then served from cache by revision."""
+    app = auth_client.application
+    app.config.update(UPLOAD_FOLDER=tmp_path / 'uploads', TIMELAPSE_FOLDER=tmp_path / 'timelapses')
+    app.config['UPLOAD_FOLDER'].mkdir()
+    user = User.query.filter_by(email='test@example.com').first()
+    for day in range(1, 4):
+        Image.new('RGB', (64, 48), (day * 60, 200, 0)).save(app.config['UPLOAD_FOLDER'] / f'{day}.jpg')
+        db.session.add(JournalEntry(sunflower_id=user.sunflower.id, date=date(2026, 3, day),
+                                    height_cm=day * 10.0, photo_path=f'{day}.jpg'))
+    db.session.commit()
+
+    response = auth_client.get('/my-journal/timelapse')
+    assert b'hx-trigger="every 2s"' in response.data
+    for job in list(timelapse._jobs.values()):
+        job.result(timeout=10)
+
+    response = auth_client.get('/my-journal/timelapse/status')
+    filename = re.search(rb'timelapses/([\w.-]+)', response.data).group(1).decode()
+    with Image.open(app.config['TIMELAPSE_FOLDER'] / filename) as animation:
+        assert animation.n_frames == 3
+
+    JournalEntry.query.filter_by(date=date(2026, 3, 3)).one().height_cm = 35.0
+    db.session.commit()
+    assert b'every 2s' in auth_client.get('/my-journal/timelapse/status').data
+    for job in list(timelapse._jobs.values()):
+        job.result(timeout=10)
+
+
+def test_timelapse_build_is_claimed_once_across_workers(auth_client, tmp_path):
+    """A build another worker holds the lock for is not started again until its lock goes stale."""
+    app = auth_client.application
+    app.config.update(UPLOAD_FOLDER=tmp_path / 'uploads', TIMELAPSE_FOLDER=tmp_path / 'timelapses')
+    app.config['UPLOAD_FOLDER'].mkdir()
+    user = User.query.filter_by(email='test@example.com').first()
+    Image.new('RGB', (64, 48), (200, 200, 0)).save(app.config['UPLOAD_FOLDER'] / '1.jpg')
+    db.session.add(JournalEntry(sunflower_id=user.sunflower.id, date=date(2026, 3, 1), photo_path='1.jpg'))
+    db.session.commit()
+    
+    _, revision = timelapse.timelapse_frames(user.sunflower.id)
+    output = app.config['TIMELAPSE_FOLDER'] / timelapse.cached_filename(user.sunflower.id, revision)
+    lock = timelapse._lock_path(output)
+    lock.parent.mkdir()
+    lock.touch()
+    args = (app.config['UPLOAD_FOLDER'], app.config['TIMELAPSE_FOLDER'], user.sunflower.id, 32, 100)
+    assert timelapse.request_timelapse(*args, lock_timeout=600)[0] == 'building'
+    assert output.name not in timelapse._jobs
+    
+    # The other worker died: its lock is taken over
+    os.utime(lock, (time.time() - 700, time.time() - 700))
+    assert timelapse.request_timelapse(*args, lock_timeout=600)[0] == 'building'
+    timelapse._jobs[output.name].result(timeout=10)
+    assert output.exists() and not lock.exists()
+    assert not list(output.parent.glob('*.part'))
+
+def test_build_assets_serves_fingerprinted_files(app, client, tmp_path):
+    """Built assets get hashed URLs, precompressed bodies and immutable caching."""
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body { color: #333; }\n' * 100)
+    app.static_folder = str(tmp_path)
+    app.extensions['asset_manifest'] = build_assets(tmp_path, app.config['COMPRESS_MIN_SIZE'])
+    
+    with app.test_request_context():
+        url = url_for('static', filename='css/site.css')
+    assert re.fullmatch(r'/static/dist/css/site\.[0-9a-f]{12}\.css', url)
+    
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+    response.close()
+    
+    response = client.get(url)
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'body')
+    response.close()
+
+
+def test_html_responses_are_compressed(client):
+    """Pages above the size threshold are gzipped for clients that accept it."""
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'<html' in gzip.decompress(response.data)
+    assert 'Accept-Encoding' in response.headers['Vary']
+    
+    assert 'Content-Encoding' not in client.get('/').headers
+
+
+def test_community_feed_follows_membership(auth_client):
+    """Joining a community adds your entries to its feed; leaving removes them."""
+    user = User.query.filter_by(email='test@example.com').first()
+    neighbor = User(email='n@example.com', display_name='Neighbor', password_hash='x')
+    neighbor.sunflower = Sunflower(name='Sunny')
+    db.session.add_all([Community(slug='maple', name='Maple Street'), neighbor])
+    db.session.commit()
+    db.session.add_all([JournalEntry(sunflower_id=user.sunflower.id, note='Mine'),
+                        JournalEntry(sunflower_id=neighbor.sunflower.id, note='Theirs')])
+    db.session.commit()
+    
+    assert 'Mine' not in auth_client.get('/community/c/maple/').get_data(as_text=True)
+    auth_client.post('/community/c/maple/join')
+    html = auth_client.get('/community/c/maple/').get_data(as_text=True)
+    assert 'Mine' in html and 'Theirs' not in html
+    
+    # New entries appear past the cached first page
+    db.session.add(JournalEntry(sunflower_id=user.sunflower.id, note='Fresh'))
+    db.session.commit()
+    assert 'Fresh' in auth_client.get('/community/c/maple/').get_data(as_text=True)
+    
+    auth_client.post('/community/c/maple/leave')
+    assert 'Mine' not in auth_client.get('/community/c/maple/').get_data(as_text=True)
+
+
+def test_community_feed_on_separate_bind(monkeypatch):
+    """A community with a bind_key keeps its feed rows on that database."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_BINDS', {'towns': 'sqlite:///:memory:'}, raising=False)
+    app = create_app('testing')
+    
+    with app.app_context():
+        user = User(email='b@example.com', display_name='Bea', password_hash='x')
+        user.sunflower = Sunflower(name='Big')
+        user.communities.append(Community(slug='big-city', name='Big City', bind_key='towns'))
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(JournalEntry(sunflower_id=user.sunflower.id, note='Shard me'))
+        db.session.commit()
+        
+        with db.engines['towns'].connect() as connection:
+            rows = connection.execute(community_feed_table('towns').select()).all()
+        assert [row.note_excerpt for row in rows] == ['Shard me']
+        assert db.session.execute(community_feed_table().select()).all() == []
+        
+        cards, _ = feeds.community_feed_page(Community.query.one())
+        assert [card.note for card in cards] == ['Shard me']
+        db.session.remove()
+        db.drop_all(bind_key=[None, 'towns'])
+        # Forget the bind's tables so later apps without it can create_all()
+        db.metadatas.pop('towns')
+
+
+
+def test_photo_hash_lookup_finds_near_duplicates(auth_client):
+    """Near copies hash a few bits apart and are found through the chunk indexes."""
+    from app.journal.phash import hamming, near_matches
+    from app.journal.utils import photo_hash
+    
+    image = Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 60).convert('RGB')
+    recompressed = io.BytesIO()
+    image.resize((150, 100)).save(recompressed, 'JPEG', quality=40)
+    value = photo_hash(image)
+    assert hamming(value, photo_hash(Image.open(recompressed))) <= 4
+    assert hamming(value, photo_hash(image.transpose(Image.Transpose.FLIP_LEFT_RIGHT))) > 10
+    
+    # Flipped bits spread over every chunk, so no chunk matches exactly
+    user = User.query.filter_by(email='test@example.com').first()
+    entries = {}
+    for flips in (0, 4, 6, 7):
+        bits = [1 << (i * 16) for i in range(4)] + [1 << 8, 1 << 24, 1 << 40]
+        entries[flips] = JournalEntry(sunflower_id=user.sunflower.id)
+        entries[flips].photo_hash = value ^ sum(bits[:flips])
+    db.session.add_all(entries.values())
+    db.session.commit()
+    
+    found = near_matches(JournalEntry.query, JournalEntry, value, max_distance=6)
+    assert found == [entries[0], entries[4], entries[6]]
+
+
+def test_ban_photo_removes_near_matches_and_blocks_uploads(auth_client, tmp_path):
+    """Banning a photo takes down its copies and rejects it on future uploads."""
+    app = auth_client.application
+    app.config['UPLOAD_FOLDER'] = tmp_path
+    user = User.query.filter_by(email='test@example.com').first()
+    user.is_admin = True
+    db.session.commit()
+    
+    def upload(size):
+        data = io.BytesIO()
+        Image.effect_mandelbrot(size, (-2, -1, 1, 1), 60).convert('RGB').save(data, 'JPEG')
+        data.seek(0)
+        return auth_client.post('/entry/new', data={'date': '2026-03-01', 'note': 'Look',
+                                                    'photo': (data, 'spam.jpg')},
+                                content_type='multipart/form-data')
+    
+    upload((300, 200))
+    upload((600, 400))
+    first, second = JournalEntry.query.order_by(JournalEntry.id).all()
+    # The re-upload is kept but flagged as a copy of the first
+    assert (first.photo_duplicate_of, second.photo_duplicate_of) == (None, first.id)
+    html = auth_client.get('/admin/entries?duplicates=1').get_data(as_text=True)
+    assert f'Duplicate of #{first.id}' in html and f'id="entry-{first.id}"' not in html
+    
+    html = auth_client.get(f'/admin/entry/{first.id}/similar').get_data(as_text=True)
+    assert f'id="entry-{second.id}"' in html
+    
+    auth_client.post(f'/admin/entry/{first.id}/ban-photo')
+    assert first.photo_path is None and second.photo_path is None
+    assert list(tmp_path.iterdir()) == []
+    
+    response = upload((450, 300))
+    assert b'Error uploading photo' in response.data
+    assert JournalEntry.query.count() == 2
+
+
+def test_leaderboard_tracks_tallest_heights(auth_client):
+    """Season maxima rise with new heights and are recomputed when the tallest goes away."""
+    from app.community import leaderboard
+    user = User.query.filter_by(email='test@example.com').first()
+    other = User(email='o@example.com', display_name='Olive', password_hash='x')
+    other.sunflower = Sunflower(name='Giant')
+    db.session.add(other)
+    db.session.commit()
+    
+    def heights():
+        return [(row.sunflower_name, row.height_cm) for row in leaderboard.tallest(2026)]
+    
+    def add(sunflower, height, day=date(2026, 7, 1), **kwargs):
+        entry = JournalEntry(sunflower_id=sunflower.id, date=day, height_cm=height, **kwargs)
+        db.session.add(entry)
+        db.session.commit()
+        return entry
+    
+    add(user.sunflower, 120)
+    tallest = add(user.sunflower, 150)
+    add(other.sunflower, 140)
+    add(other.sunflower, 300, is_public=False)
+    add(other.sunflower, 500, day=date(2025, 8, 1))
+    assert heights() == [('Test Sunflower', 150), ('Giant', 140)]
+    
+    tallest.height_cm = 130
+    db.session.commit()
+    assert heights() == [('Giant', 140), ('Test Sunflower', 130)]
+    
+    db.session.delete(tallest)
+    db.session.commit()
+    assert heights() == [('Giant', 140), ('Test Sunflower', 120)]
+    
+    html = auth_client.get('/community/tallest?season=2025').get_data(as_text=True)
+    assert 'Giant' in html and '500.0 cm' in html
+    
+    # The rebuild command derives the same rows from scratch
+    before = db.session.query(SeasonHeight.sunflower_id, SeasonHeight.season,
+                              SeasonHeight.max_height_cm).order_by(SeasonHeight.sunflower_id,
+                                                                   SeasonHeight.season).all()
+    result = auth_client.application.test_cli_runner().invoke(args=['rebuild-leaderboard'])
+    assert result.exit_code == 0, result.output
+    assert db.session.query(SeasonHeight.sunflower_id, SeasonHeight.season,
+                            SeasonHeight.max_height_cm).order_by(SeasonHeight.sunflower_id,
+                                                                 SeasonHeight.season).all() == before
+
+
+def test_deleting_sunflower_with_leaderboard_rows_keeps_foreign_keys(auth_client):
+    """Season maxima go with their sunflower when the database enforces foreign keys."""
+    from app.community import leaderboard
+    db.session.connection().exec_driver_sql('PRAGMA foreign_keys=ON')
+    db.session.commit()
+    user = User.query.filter_by(email='test@example.com').first()
+    db.session.add(JournalEntry(sunflower_id=user.sunflower.id, date=date.today(), height_cm=180))
+    db.session.commit()
+    assert len(leaderboard.tallest()) == 1
+    assert leaderboard.tallest(1900) == []
+    assert 1900 not in {season for season, _ in leaderboard._cache}
+    assert auth_client.get('/community/tallest?season=99999999999999999999').status_code == 404
+    
+    db.session.delete(user)
+    db.session.commit()
+    assert SeasonHeight.query.count() == 0
+
+def test_sync_returns_only_changes_since_revision(auth_client):
+    """Delta sync sends changed rows and tombstones, never splitting a revision across pages."""
+    user = User.query.filter_by(email='test@example.com').first()
+    entries = [JournalEntry(sunflower_id=user.sunflower.id, note=f'Day {i}') for i in range(3)]
+    db.session.add_all(entries)
+    db.session.commit()
+    
+    full = auth_client.get('/api/v1/sync').get_json()
+    assert full['sunflower']['name'] == 'Test Sunflower'
+    assert sorted(entry['note'] for entry in full['entries']) == ['Day 0', 'Day 1', 'Day 2']
+    
+    entries[0].note = 'Edited'
+    db.session.delete(entries[1])
+    db.session.commit()
+    delta = auth_client.get(f"/api/v1/sync?since={full['rev']}").get_json()
+    assert [entry['note'] for entry in delta['entries']] == ['Edited']
+    assert delta['deleted'] == {'entries': [entries[1].id], 'sunflowers': []}
+    assert delta['sunflower'] is None
+    
+    idle = auth_client.get(f"/api/v1/sync?since={delta['rev']}")
+    assert idle.get_json()['entries'] == [] and len(idle.data) < 200
+    
+    # Pages end on revision boundaries, even when one revision is larger than a page
+    auth_client.application.config['SYNC_PAGE_SIZE'] = 1
+    db.session.add_all([JournalEntry(sunflower_id=user.sunflower.id, note=note) for note in ('A', 'B')])
+    db.session.commit()
+    db.session.add(JournalEntry(sunflower_id=user.sunflower.id, note='C'))
+    db.session.commit()
+    first = auth_client.get(f"/api/v1/sync?since={delta['rev']}").get_json()
+    assert [entry['note'] for entry in first['entries']] == ['A', 'B'] and first['more']
+    second = auth_client.get(f"/api/v1/sync?since={first['rev']}").get_json()
+    assert [entry['note'] for entry in second['entries']] == ['C'] and not second['more']
+
+
+def test_sync_revisions_are_counted_per_journal(auth_client):
+    """Writes to one journal never take another's revisions; pruning resets only stale clients."""
+    from app.sync import prune_tombstones
+    user = User.query.filter_by(email='test@example.com').first()
+    other = User(email='o@example.com', display_name='Olive', password_hash='x')
+    other.sunflower = Sunflower(name='Giant')
+    db.session.add(other)
+    db.session.commit()
+    entry = JournalEntry(sunflower_id=user.sunflower.id, note='Mine')
+    db.session.add(entry)
+    db.session.commit()
+    before = auth_client.get('/api/v1/sync').get_json()['rev']
+    
+    for note in ('Theirs', 'Also theirs'):
+        db.session.add(JournalEntry(sunflower_id=other.sunflower.id, note=note))
+        db.session.commit()
+    assert auth_client.get('/api/v1/sync').get_json()['rev'] == before
+    assert other.sunflower.rev_seq == 3
+    
+    db.session.delete(entry)
+    db.session.commit()
+    db.session.query(SyncTombstone).update({'created_at': datetime(2020, 1, 1)})
+    db.session.commit()
+    assert prune_tombstones(timedelta(days=90)) == 1
+    assert auth_client.get(f'/api/v1/sync?since={before}').get_json()['reset']
+    assert not auth_client.get(f'/api/v1/sync?since={before + 1}').get_json()['reset']
+
+def test_batch_upload_is_idempotent(client, auth_client):
+    """Retrying an upload with the same keys does not create duplicates."""
+    upload = io.BytesIO()
+    Image.new('RGB', (40, 30), 'orange').save(upload, 'PNG')
+    batch = {'entries': [
+        {'key': 'a1', 'date': '2026-06-01', 'note': 'Offline', 'height_cm': 42.5,
+         'photo': {'filename': 'a.png', 'data': base64.b64encode(upload.getvalue()).decode()}},
+        {'key': 'b2', 'date': 'not a date'},
+        {'key': 'c3', 'date': '2026-06-02', 'is_public': 'false'},
+    ]}
+    
+    first = auth_client.post('/api/v1/entries', json=batch).get_json()['entries']
+    assert [result['status'] for result in first] == ['created', 'invalid', 'invalid']
+    assert 'date' in first[1]['errors']
+    assert 'is_public' in first[2]['errors']
+    
+    again = auth_client.post('/api/v1/entries', json=batch).get_json()['entries']
+    assert again[0] == {'key': 'a1', 'status': 'exists', 'id': first[0]['id']}
+    
+    entry = JournalEntry.query.one()
+    assert (entry.note, entry.height_cm, entry.photo_width) == ('Offline', 42.5, 40)
+    delete_photo(entry.photo_path)
+    
+    auth_client.get('/auth/logout')
+    response = auth_client.get('/api/v1/sync')
+    assert response.status_code == 401 and response.is_json
+
+
+def test_reactions_toggle_and_show_in_feed(auth_client):
+    """Sunflowering an entry toggles one reaction per user, counted in the feed row."""
+    user = User.query.filter_by(email='test@example.com').first()
+    entry = JournalEntry(sunflower_id=user.sunflower.id, note='Bloom!')
+    db.session.add(entry)
+    db.session.commit()
+    edited = entry.updated_at
+    
+    response = auth_client.post(f'/community/entry/{entry.id}/react', headers={'HX-Request': 'true'})
+    assert 'aria-pressed="true"' in response.get_data(as_text=True)
+    db.session.expire_all()
+    assert (entry.reaction_count, entry.updated_at) == (1, edited)
+    assert '🌻 1' in auth_client.get('/community/').get_data(as_text=True)
+    assert db.session.get(FeedItem, entry.id).reaction_count == 1
+    
+    with pytest.raises(IntegrityError):
+        db.session.add(Reaction(user_id=user.id, entry_id=entry.id))
+        db.session.commit()
+    db.session.rollback()
+    
+    response = auth_client.post(f'/community/entry/{entry.id}/react', headers={'HX-Request': 'true'})
+    assert '🌻 0' in response.get_data(as_text=True)
+    assert db.session.get(FeedItem, entry.id).reaction_count == 0
+
+
+def test_reaction_counter_coalesces_updates(auth_client):
+    """Buffered reactions update each entry's count once per flush."""
+    app = auth_client.application
+    app.config['REACTION_FLUSH_INTERVAL'] = 60
+    counter = app.extensions['reaction_counter']
+    user = User.query.filter_by(email='test@example.com').first()
+    entry = JournalEntry(sunflower_id=user.sunflower.id, note='Popular')
+    db.session.add(entry)
+    neighbors = [User(email=f'n{i}@example.com', display_name=f'N{i}', password_hash='x') for i in range(3)]
+    db.session.add_all(neighbors)
+    db.session.commit()
+    
+    for neighbor in neighbors:
+        db.session.add(Reaction(user_id=neighbor.id, entry_id=entry.id))
+        db.session.commit()
+        counter.record(entry.id)
+    assert counter.pending == {entry.id}
+    assert db.session.get(FeedItem, entry.id).reaction_count == 0
+    
+    assert counter.flush() == 1
+    db.session.expire_all()
+    assert (entry.reaction_count, db.session.get(FeedItem, entry.id).reaction_count) == (3, 3)
+    
+    # Deleting a user takes their reactions with them
+    db.session.delete(neighbors[0])
+    db.session.commit()
+    db.session.expire_all()
+    assert entry.reaction_count == 2
@@ -0,0 +1,276 @@
+"""Query-plan regression tests for the hot queries behind the busiest pages.
+
+A realistically sized dataset is seeded, the pages below are requested
+with every SELECT they run captured, and each statement is matched to a
+named entry in HOT_QUERIES and EXPLAINed. A query that loses its index
+(a full table scan, or a sort the index should have made unnecessary)
+fails its test; a route query that matches no entry fails
+test_route_queries_are_registered, so new queries get reviewed here.
+
+Runs on in-memory SQLite by default. Set TEST_POSTGRES_URL to an empty
+PostgreSQL database to run the same checks there as well; PostgreSQL
+plans are also held to each query's row estimate limit.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app import create_app, db
+from app.community import feeds, leaderboard, timeline
+from app.journal import archive, buckets
+from app.models import Community, JournalEntry, Sunflower, User, community_members
+from app.pagination import encode_cursor
+from config import TestingConfig
+
+USERS = 120
+ENTRIES_PER_USER = 60
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    """A query a route is expected to run, and what its plan must look like."""
+    name: str
+    pattern: str            # regex matched against the whitespace-collapsed SQL
+    index: str = None       # index the plan must use (None: any, as long as nothing is scanned)
+    scans: tuple = ()       # tables allowed to be read in full
+    sorts: bool = False     # whether a separate sort / grouping step is acceptable
+    max_rows: int = None    # PostgreSQL row estimate limit
+    
+    def __str__(self):
+        return self.name
+
+
+# First match wins, so the count(*) wrappers come before the queries they wrap
+HOT_QUERIES = (
+    HotQuery('admin-user-count', r'^SELECT count\(\*\) .* FROM users\) AS anon_1$', scans=('users',)),
+    HotQuery('admin-entry-count', r'^SELECT count\(\*\) .* FROM journal_entries\) AS anon_1$',
+             scans=('journal_entries',)),
+    HotQuery('admin-entries-count', r'^SELECT count\(\*\) .* FROM journal_entries JOIN sunflowers',
+             scans=('journal_entries', 'sunflowers', 'users')),
+    HotQuery('login-by-email', r'FROM users WHERE users\.email = ', index='ix_users_email', max_rows=1),
+    HotQuery('load-user', r'FROM users WHERE users\.id = ', max_rows=1),
+    HotQuery('user-sunflower', r'FROM sunflowers WHERE \S+ = sunflowers\.user_id', max_rows=1),
+    HotQuery('feed-page', r'FROM feed_timeline ORDER BY feed_timeline\.date DESC|'
+             r'FROM feed_timeline WHERE \(feed_timeline\.date, ', index='ix_feed_timeline_order', max_rows=21),
+    HotQuery('feed-reacted', r'FROM reactions WHERE reactions\.user_id = .* AND reactions\.entry_id IN ',
+             max_rows=21),
+    HotQuery('user-communities', r'FROM communities, community_members WHERE \S+ = community_members\.user_id'),
+    HotQuery('community-by-slug', r'FROM communities WHERE communities\.slug = ', max_rows=1),
+    HotQuery('community-feed-page', r'FROM community_feed WHERE community_feed\.community_id = ',
+             index='ix_community_feed_order', max_rows=21),
+    HotQuery('leaderboard', r'FROM season_heights JOIN sunflowers .* WHERE season_heights\.season = ',
+             index='ix_season_heights_board', max_rows=20),
+    HotQuery('journal-periods', r'FROM journal_buckets WHERE journal_buckets\.sunflower_id = ', max_rows=5),
+    HotQuery('journal-has-archive', r'^SELECT EXISTS \(SELECT 1 FROM journal_entries_archive ',
+             index='ix_journal_entries_archive_sunflower_date'),
+    HotQuery('journal-period-entries',
+             r'FROM journal_entries JOIN sunflowers .* WHERE journal_entries\.sunflower_id = ',
+             index='ix_journal_entries_sunflower_date', max_rows=100),
+    HotQuery('archive-seasons', r'FROM journal_entries_archive WHERE .* GROUP BY ',
+             index='ix_journal_entries_archive_sunflower_date', sorts=True, max_rows=20),
+    HotQuery('archive-entries', r'FROM journal_entries_archive JOIN sunflowers ',
+             index='ix_journal_entries_archive_sunflower_date', max_rows=21),
+    HotQuery('sync-revision', r'FROM sunflowers WHERE sunflowers\.id = ', max_rows=1),
+    HotQuery('sync-entries', r'FROM journal_entries WHERE journal_entries\.sunflower_id = .* '
+             r'AND journal_entries\.rev > ', index='ix_journal_entries_sunflower_rev', max_rows=201),
+    HotQuery('sync-tombstones', r'FROM sync_tombstones WHERE sync_tombstones\.user_id = ',
+             index='ix_sync_tombstones_user_rev'),
+    HotQuery('admin-recent-users', r'FROM users ORDER BY users\.created_at DESC',
+             index='ix_users_created_at', max_rows=50),
+    HotQuery('admin-recent-entries', r'FROM journal_entries JOIN sunflowers .* '
+             r'ORDER BY journal_entries\.created_at DESC', index='ix_journal_entries_created_at', max_rows=50),
+)
+
+FEED_CURSOR = encode_cursor([date(2025, 9, 1), datetime(2025, 9, 1), USERS * ENTRIES_PER_USER // 2])
+
+# (method, url) pairs whose queries are captured, as the admin who owns sunflower 1
+ROUTES = (
+    ('POST', '/auth/login'),
+    ('GET', '/community/'),
+    ('GET', f'/community/entries?cursor={FEED_CURSOR}'),
+    ('GET', '/community/c/town-2/'),
+    ('GET', f'/community/c/town-2/entries?cursor={FEED_CURSOR}'),
+    ('GET', '/community/tallest?season=2025'),
+    ('GET', '/my-journal'),
+    ('GET', '/my-journal/periods?group=week'),
+    ('GET', '/my-journal/month/2025-07-01'),
+    ('GET', '/my-journal/archive'),
+    ('GET', '/my-journal/archive/2025/entries'),
+    ('GET', '/api/v1/sync?since=1'),
+    ('GET', '/admin/'),
+    ('GET', '/admin/entries?page=2'),
+)
+
+
+def _seed():
+    """Insert USERS users with ENTRIES_PER_USER entries each, then derive the read models."""
+    admin = User(id=1, email='admin@example.com', display_name='Admin', is_admin=True,
+                 created_at=datetime(2025, 1, 1))
+    admin.set_password('adminpass')
+    db.session.add(admin)
+    db.session.flush()
+    
+    db.session.execute(insert(User), [
+        dict(id=i, email=f'user{i}@example.com', display_name=f'User {i}', is_admin=False,
+             password_hash=admin.password_hash, created_at=datetime(2025, 1, 1) + timedelta(hours=i))
+        for i in range(2, USERS + 1)])
+    db.session.execute(insert(Sunflower), [
+        dict(id=i, user_id=i, name=f'Sunflower {i}', planted_date=date(2025, 4, 1),
+             theme='yellow', created_at=datetime(2025, 1, 1), rev_seq=2)
+        for i in range(1, USERS + 1)])
+    db.session.execute(insert(JournalEntry), [
+        dict(id=(i - 1) * ENTRIES_PER_USER + day + 1, sunflower_id=i,
+             date=date(2025, 3, 1) + timedelta(days=day * 5), note=f'Day {day}', height_cm=day * 3.0,
+             is_public=day % 5 != 0, created_at=datetime(2025, 3, 1) + timedelta(days=day * 5, minutes=i))
+        for i in range(1, USERS + 1) for day in range(ENTRIES_PER_USER)])
+    
+    # Ten towns; every user belongs to one, the admin to all
+    db.session.execute(insert(Community), [
+        dict(id=i, slug=f'town-{i}', name=f'Town {i}', created_at=datetime(2025, 1, 1))
+        for i in range(1, 11)])
+    db.session.execute(insert(community_members), [
+        dict(user_id=i, community_id=i % 10 + 1) for i in range(2, USERS + 1)])
+    db.session.execute(insert(community_members), [
+        dict(user_id=1, community_id=i) for i in range(1, 11)])
+    
+    connection = db.session.connection()
+    timeline.rebuild_range(connection, 1, USERS * ENTRIES_PER_USER)
+    for sunflower_id in range(1, USERS + 1):
+        buckets.rebuild_sunflower(connection, sunflower_id)
+    for community in Community.query:
+        feeds.rebuild_community(db.session, community)
+    leaderboard.rebuild_range(connection, 1, USERS)
+    db.session.commit()
+    archive.archive_entries(date(2025, 6, 1), sunflower_id=1)
+
+
+def _normalize(sql):
+    return ' '.join(sql.split())
+
+
+@pytest.fixture(scope='module', params=['sqlite', 'postgresql'])
+def captured(request):
+    """
+    Seed a database, request ROUTES and capture their SELECTs.
+    
+    Returns:
+        tuple: (app, [(sql, parameters), ...]) with duplicate statements removed
+    """
+    url = 'sqlite:///:memory:'
+    if request.param == 'postgresql':
+        url = os.environ.get('TEST_POSTGRES_URL')
+        if not url:
+            pytest.skip('TEST_POSTGRES_URL is not set')
+    
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', url)
+        app = create_app('testing')
+    
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        _seed()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        engine = db.engine
+    
+    statements = {}
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.setdefault(_normalize(statement), (statement, parameters))
+    
+    # Requests run without an outer app context, each with a fresh session as in production
+    client = app.test_client()
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for method, url in ROUTES:
+            if method == 'POST':
+                response = client.post(url, data={'email': 'admin@example.com', 'password': 'adminpass'})
+                assert response.status_code == 302, url
+            else:
+                assert client.get(url).status_code == 200, url
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    
+    yield app, list(statements.values())
+    
+    with app.app_context():
+        db.drop_all()
+
+
+def _match(sql):
+    """The HotQuery a statement belongs to, or None."""
+    sql = _normalize(sql)
+    return next((hot for hot in HOT_QUERIES if re.search(hot.pattern, sql)), None)
+
+
+def _sqlite_plan(connection, statement, parameters):
+    """(scanned tables, indexes used, sorts, row estimate) from EXPLAIN QUERY PLAN."""
+    scans, indexes, sorts = set(), set(), False
+    for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+        detail = row[-1]
+        table_scan = re.fullmatch(r'SCAN (\w+)', detail)
+        if table_scan:
+            scans.add(table_scan.group(1))
+        index = re.search(r'USING (?:COVERING )?INDEX (\w+)', detail)
+        if index:
+            indexes.add(index.group(1))
+        sorts = sorts or detail.startswith('USE TEMP B-TREE')
+    return scans, indexes, sorts, None
+
+
+def _postgres_plan(connection, statement, parameters):
+    """(scanned tables, indexes used, sorts, row estimate) from EXPLAIN (FORMAT JSON)."""
+    # Index use is checked with sequential scans priced out, so small tables still count
+    connection.exec_driver_sql('SET enable_seqscan = off')
+    result = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    connection.exec_driver_sql('RESET enable_seqscan')
+    plan = (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+    
+    scans, indexes, sorts = set(), set(), False
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.add(node['Relation Name'])
+        if 'Index Name' in node:
+            indexes.add(node['Index Name'])
+        sorts = sorts or node['Node Type'] in ('Sort', 'Incremental Sort', 'HashAggregate')
+        nodes.extend(node.get('Plans', ()))
+    return scans, indexes, sorts, plan['Plan Rows']
+
+
+def test_route_queries_are_registered(captured):
+    """Every SELECT the hot routes run is named in HOT_QUERIES."""
+    _, statements = captured
+    unregistered = [_normalize(sql) for sql, _ in statements if _match(sql) is None]
+    
+    assert not unregistered, 'Register these route queries in HOT_QUERIES:\n' + '\n'.join(unregistered)
+
+
+@pytest.mark.parametrize('hot', HOT_QUERIES, ids=str)
+def test_hot_query_plan(captured, hot):
+    """Each hot query runs, uses its index and reads no more than it should."""
+    app, statements = captured
+    matching = [(sql, params) for sql, params in statements if _match(sql) is hot]
+    assert matching, f'{hot} was not run by any route in ROUTES'
+    
+    with app.app_context():
+        connection = db.session.connection()
+        explain = _postgres_plan if connection.dialect.name == 'postgresql' else _sqlite_plan
+        for sql, params in matching:
+            scans, indexes, sorts, rows = explain(connection, sql, params)
+            
+            assert scans <= set(hot.scans), f'{hot} scans {sorted(scans - set(hot.scans))}'
+            if hot.index:
+                assert hot.index in indexes, f'{hot} does not use {hot.index} (uses {sorted(indexes)})'
+            if not hot.sorts:
+                assert not sorts, f'{hot} sorts instead of reading its index in order'
+            if rows is not None and hot.max_rows is not None:
+                assert rows <= hot.max_rows, f'{hot} is estimated to return {rows} rows'